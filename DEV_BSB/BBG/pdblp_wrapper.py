@@ -5,10 +5,9 @@ EXPERIMENTAL!!
 
 # Python
 from os import path
-from itertools import groupby
+from collections import defaultdict
 
 # External
-import numpy as np
 import pandas as pd
 import pdblp
 
@@ -51,8 +50,6 @@ def bdh_cache(fpath, bcon, tickers, flds, start_date, end_date, **kwargs):
     else:
         cache_df = pd.read_csv(fpath, sep=';', parse_dates=['date'])
 
-    cache_ix = cache_df.set_index(['date', 'ticker', 'field']).index
-
     # normalize bdh arguments, and construct the query index:
     dates = pct.bday_range(start_date, end_date)
     tickers = [tickers.upper()] if isinstance(tickers, str) else list(map(str.upper, tickers))
@@ -61,51 +58,77 @@ def bdh_cache(fpath, bcon, tickers, flds, start_date, end_date, **kwargs):
         dates, tickers, flds
     ], names=['date', 'ticker', 'field'])
 
-    # contrast queried index with cached index:
-    _intersect_ix = new_ix.intersection(cache_ix)
-    diff_ix = new_ix.difference(cache_ix)
-    assert len(_intersect_ix) + len(diff_ix) == len(new_ix)
-    if len(_intersect_ix) != 0:
-        print(f'{len(_intersect_ix)} rows already in cache')
+    # contrast queried index with cached index (only cached rows in the
+    # queried period matter), hashing the cached index a single time:
+    in_period = cache_df['date'].between(dates[0], dates[-1]) if len(dates) \
+        else pd.Series(False, index=cache_df.index)
+    cache_ix = pd.MultiIndex.from_frame(
+        cache_df.loc[in_period, ['date', 'ticker', 'field']]
+    )
+    is_cached = new_ix.isin(cache_ix)
+    diff_ix = new_ix[~is_cached]
+    n_cached = int(is_cached.sum())
+    if n_cached != 0:
+        print(f'{n_cached} rows already in cache')
 
     # override longdata (needed to keep csv in order)
     kwargs['longdata'] = True
 
+    # group the missing dates and fields by ticker, so we bdh each
+    # ticker only once, spanning all of its missing dates:
+    ticker_dates = defaultdict(list)
+    ticker_flds = defaultdict(dict)  # dict keys as an insertion ordered set
+    for date, ticker, fld in diff_ix:
+        ticker_dates[ticker].append(date)
+        ticker_flds[ticker][fld] = None
+
+    # tickers with the same span and fields go together in a single
+    # request. Obs: BCon is not thread-safe (one blpapi session, read
+    # synchronously), so we batch the requests instead of parallelizing them
+    bdh_requests = defaultdict(list)
+    for ticker, batch_dates in ticker_dates.items():
+        start_str = min(batch_dates).strftime("%Y%m%d")
+        end_str = max(batch_dates).strftime("%Y%m%d")
+        req_flds = tuple(ticker_flds[ticker])
+        bdh_requests[(start_str, end_str, req_flds)].append(ticker)
+
     # now we bdh only the diff_ix values:
-    pulled_df = pd.DataFrame(columns=expected_cols)
-    for date, group in groupby(diff_ix.values, key=lambda tup: tup[0]):
-        items = list(group)
-        tickers = list(np.unique([t[1] for t in items]))
-        flds = list(np.unique([t[2] for t in items]))
-        date_str = date.strftime("%Y%m%d")
-
-        for ticker in tickers:
+    frames = []
+    for (start_str, end_str, req_flds), req_tickers in bdh_requests.items():
+        try:
+            frames.append(
+                bcon.bdh(req_tickers, list(req_flds), start_str, end_str, **kwargs)
+            )
+            continue
+        except ValueError:
+            # some invalid security in the batch: request one by one
+            pass
+
+        for ticker in req_tickers:
             try:
-                temp_df = bcon.bdh(ticker, flds, date_str, date_str, **kwargs)
+                frames.append(
+                    bcon.bdh(ticker, list(req_flds), start_str, end_str, **kwargs)
+                )
             except ValueError:
+                # invalid security error: reindex below fills with NaN values
                 print(f"invalid security: {ticker}")
-                # invalid security error: fill with NaN values
-                temp_df = pd.DataFrame(index=range(len(flds)))
-                temp_df["date"] = date
-                temp_df["ticker"] = ticker
-                temp_df["field"] = flds
-                temp_df["value"] = np.nan
 
-            temp_df = temp_df.set_index(['date', 'ticker', 'field']).reindex(
-                pd.MultiIndex.from_product([
-                    [date], [ticker], flds
-                ], names=['date', 'ticker', 'field'])
-            ).reset_index()
-
-            pulled_df = pd.concat([pulled_df, temp_df], ignore_index=True)
+    # a single concat and reindex for all the bdh's: keeps only the missing
+    # values (a ticker's span may contain cached dates), and fills with NaN
+    # the ones not returned by the bloomberg
+    pulled_df = pd.concat(frames, ignore_index=True) if frames \
+        else pd.DataFrame(columns=expected_cols)
+    pulled_df = pulled_df.set_index(['date', 'ticker', 'field']) \
+                         .reindex(diff_ix).reset_index()
 
     print('Pulled data:')
     print(pulled_df)
 
-    cache_df = pd.concat([cache_df, pulled_df], ignore_index=True)
-
-    # save to csv:
-    cache_df.to_csv(fpath, sep=';', date_format='%Y-%m-%d', index=False)
+    # save to csv: the pulled rows are appended at the end of the file
+    # (same result as concatenating them to the cache), instead of
+    # rewriting the whole cache
+    pulled_df.to_csv(fpath, sep=';', date_format='%Y-%m-%d', index=False,
+                     mode='a', header=not path.isfile(fpath))
     print("saved to csv")
 
     return pulled_df
@@ -3,10 +3,12 @@ Script para baixar os ajustes de pregão da BMF da internet,
 salvar na rede e carregar os dados
 """
 
+import io
 from os import path
 
 import pandas as pd
-from requests_html import HTMLSession, HTML
+import pyarrow.csv as pacsv
+import requests
 
 
 __all__ = ['load_ajustes_bmf']
@@ -24,23 +26,26 @@ class AjustesBMF:
         self.filename = f'ajustes_bmf_{self.ref_date_str}.csv'
         self.filepath = path.join(self.root_folder, self.filename)
 
-    def _download(self) -> HTML:
+    def _download(self) -> str:
         """
         Baixa os ajustes do pregão da internet e retorna o HTML correspondente
         """
         data_url = r'http://www2.bmf.com.br/pages/portal/bmfbovespa/lumis/' \
                    r'lum-ajustes-do-pregao-ptBR.asp'
         payload = {"dData1": self.ref_date.strftime('%d/%m/%Y')}
-        with HTMLSession(mock_browser=True) as session:
-            r = session.post(data_url, payload)
+        # user agent de browser, como o antigo mock_browser do requests_html
+        headers = {'User-Agent': 'Mozilla/5.0'}
+        with requests.Session() as session:
+            r = session.post(data_url, payload, headers=headers)
         r.raise_for_status()
         print(f'AjustesBMF de {self.ref_date_str} baixado da internet')
-        return r.html
+        return r.text
 
     def _parse_html(self, html):
-        table = html.find('table#tblDadosAjustes')[0]
-        df = pd.read_html(table.html, thousands='.', decimal=',')[0]
-        df.Mercadoria.fillna(method='ffill', inplace=True)
+        # pd.read_html acha a tabela pelo id, em um só parse (lxml) do html
+        df = pd.read_html(io.StringIO(html), attrs={'id': 'tblDadosAjustes'},
+                          thousands='.', decimal=',')[0]
+        df['Mercadoria'] = df['Mercadoria'].ffill()
         return df
 
     def _save_to_network_dir(self, df):
@@ -50,7 +55,14 @@ class AjustesBMF:
     def load(self) -> pd.DataFrame:
         if path.isfile(self.filepath):
             print(f'{self.filename} carregado da rede')
-            return pd.read_csv(self.filepath, sep=';')
+            # leitor csv do pyarrow (multithreaded), convertido p/ pandas.
+            # Campos vazios são lidos como nulos, como no pd.read_csv
+            table = pacsv.read_csv(
+                self.filepath,
+                parse_options=pacsv.ParseOptions(delimiter=';'),
+                convert_options=pacsv.ConvertOptions(strings_can_be_null=True),
+            )
+            return table.to_pandas()
 
         df = self._parse_html(self._download())
         self._save_to_network_dir(df)
@@ -3,14 +3,17 @@ Puxa séries temporais do webservice do BACEN
 """
 
 # Python
+import io
+import os
 import json
 from functools import lru_cache
 from collections import defaultdict
+from datetime import timedelta
 from lxml import etree
 
 # External
 import requests
-from requests_html import HTMLSession
+import requests_cache
 import pandas as pd
 
 
@@ -24,6 +27,27 @@ xsi = 'http://www.w3.org/2001/XMLSchema-instance'
 url_webservice = 'https://www3.bcb.gov.br/wssgs/services/FachadaWSSGS'
 
 
+@lru_cache(maxsize=None)
+def _session():
+    """
+    Sessão http com cache persistente em disco (sqlite, em TEMP/SGS),
+    compartilhada pelas consultas ao SGS e ao sistema de expectativas:
+    execuções repetidas não voltam à rede. O POST do SGS também é cacheado
+    (chave = url + body), e as respostas expiram em 12h, p/ não reaproveitar
+    dados de dias anteriores. Criada só no primeiro uso
+    """
+    usr_temp_folder = os.environ.get('TEMP')
+    if usr_temp_folder is None:
+        # sem pasta p/ o cache: sessão comum
+        return requests.Session()
+    cache_folder = os.path.join(usr_temp_folder, 'SGS')
+    os.makedirs(cache_folder, exist_ok=True)
+    return requests_cache.CachedSession(
+        os.path.join(cache_folder, 'sgs_cache'), backend='sqlite',
+        expire_after=timedelta(hours=12), allowable_methods=('GET', 'POST'),
+    )
+
+
 def _send_request(cod, st_date, end_date):
     """Constructs the XML for request and returns the XML response in bytes"""
     # Preparing the XML to send:
@@ -38,8 +62,7 @@ def _send_request(cod, st_date, end_date):
     env += ''' </soapenv:Body>'''
     env += '''</soapenv:Envelope>'''
     headers = {'soapAction': "https://www3.bcb.gov.br/wssgs/services/FachadaWSSGS/getValoresSeriesXML"}
-    with HTMLSession(mock_browser=False) as session:
-        r = session.post(url_webservice + '?method=getValoresSeriesXML', data=env, headers=headers)
+    r = _session().post(url_webservice + '?method=getValoresSeriesXML', data=env, headers=headers)
     return r.content
 
 
@@ -47,15 +70,24 @@ def _parse_xml(xml_str):
     """Parses XML response and returns a dataframe with the content"""
     root = etree.fromstring(xml_str)
     xml_return = root.xpath('// getValoresSeriesXMLReturn')
-    series = etree.fromstring(bytes(xml_return[0].text, encoding='ISO-8859-1'))
+    series = bytes(xml_return[0].text, encoding='ISO-8859-1')
+
+    # stream the series items, appending each field to its column
+    # and releasing the already parsed items
     data = defaultdict(list)
-    for item in series[0]:
-        for el in item.getchildren():
+    for _, item in etree.iterparse(io.BytesIO(series), tag='ITEM'):
+        for el in item:
             data[el.tag].append(el.text)
-
-    df = pd.DataFrame.from_dict(data)
-    # df['DATA'] = [pd.Timestamp.strptime(d, "%d/%m/%Y").date() for d in dates]
-    # df['VALOR'] = [float(v) for v in values]
+        item.clear()
+        while item.getprevious() is not None:
+            del item.getparent()[0]
+
+    df = pd.DataFrame(data)
+    # parse dates and values in bulk:
+    if 'DATA' in df.columns:
+        df['DATA'] = pd.to_datetime(df['DATA'], format='%d/%m/%Y', cache=True)
+    if 'VALOR' in df.columns:
+        df['VALOR'] = pd.to_numeric(df['VALOR'])
     return df
 
 
@@ -120,7 +152,7 @@ def _bc_sist_expectativas(which, **filters):
     filter_url = '%20and%20'.join(f"""{k}%20eq%20%27{v.replace(' ', '%20')}%27""" for k, v in filters.items())
     url = f'https://olinda.bcb.gov.br/olinda/servico/Expectativas/versao/v1/odata/{which}?$format=json&$filter={filter_url}'
     try:
-        r = requests.get(url)
+        r = _session().get(url)
     except requests.exceptions.ProxyError as e:
         msg = f'Erro normal de proxy. Tentar de novo ou acessar manualmente a url {url}'
         raise type(e)(msg) from e
@@ -144,14 +176,14 @@ def expect_ipca_acum_12m(ref_date) -> pd.Series:
     return pd.Series(jresp, name=ref_date)
 
 
-def expect_ipca_mensal(ref_date) -> pd.DataFrame:
+def _expect_mensal(indicador, ref_date) -> pd.DataFrame:
     """
-    Estatísticas de expectativa do IPCA mês a mês
+    Estatísticas de expectativa mês a mês de dado indicador ('IPCA', 'IGP-M')
     """
     ref_date = pd.Timestamp(ref_date)
     which = 'ExpectativaMercadoMensais'
     filters = {
-        'Indicador': 'IPCA',
+        'Indicador': indicador,
         'Data': ref_date.strftime("%Y-%m-%d"),
     }
     # read dict response as dataframe
@@ -159,13 +191,15 @@ def expect_ipca_mensal(ref_date) -> pd.DataFrame:
     df = pd.DataFrame(jresp)
 
     # clean frame & checks:
-    assert (df['Indicador'] == 'IPCA').all(), 'Erro indicador buscado'
+    assert (df['Indicador'] == indicador).all(), 'Erro indicador buscado'
     # campo baseCalculo que aparentemente as consultas no site pegam apenos o igual a 0
-    # (mais info sobre baseCalculo no link de documentação)
-    df = df.loc[df['baseCalculo'] == 0]
-    # ordenar por data ref de IPCA
-    df['DataReferencia'] = pd.to_datetime(df['DataReferencia'], format='%m/%Y')
-    df['Data'] = pd.to_datetime(df['Data'], format='%Y-%m-%d')
+    # (mais info sobre baseCalculo no link de documentação).
+    # Filtrado antes de converter as datas, p/ não converter linhas descartadas
+    df = df.loc[df['baseCalculo'] == 0].copy()
+    # ordenar por data ref do indicador. Datas repetidas (todo 'Data' é a
+    # ref_date) são convertidas uma só vez com cache=True
+    df['DataReferencia'] = pd.to_datetime(df['DataReferencia'], format='%m/%Y', cache=True)
+    df['Data'] = pd.to_datetime(df['Data'], format='%Y-%m-%d', cache=True)
     assert (df['Data'] == ref_date).all(), 'Erro data ref buscada'
     df.set_index('DataReferencia', verify_integrity=True, inplace=True)
     # sort:
@@ -173,33 +207,18 @@ def expect_ipca_mensal(ref_date) -> pd.DataFrame:
     return df
 
 
+def expect_ipca_mensal(ref_date) -> pd.DataFrame:
+    """
+    Estatísticas de expectativa do IPCA mês a mês
+    """
+    return _expect_mensal('IPCA', ref_date)
+
+
 def expect_igpm_mensal(ref_date) -> pd.DataFrame:
     """
     Estatísticas de expectativa do IGP-M mês a mês
     """
-    ref_date = pd.Timestamp(ref_date)
-    which = 'ExpectativaMercadoMensais'
-    filters = {
-        'Indicador': 'IGP-M',
-        'Data': ref_date.strftime("%Y-%m-%d"),
-    }
-    # read dict response as dataframe
-    jresp = _bc_sist_expectativas(which, **filters)
-    df = pd.DataFrame(jresp)
-
-    # clean frame & checks:
-    assert (df['Indicador'] == 'IGP-M').all(), 'Erro indicador buscado'
-    # campo baseCalculo que aparentemente as consultas no site pegam apenos o igual a 0
-    # (mais info sobre baseCalculo no link de documentação)
-    df = df.loc[df['baseCalculo'] == 0]
-    # ordenar por data ref de IPCA
-    df['DataReferencia'] = pd.to_datetime(df['DataReferencia'], format='%m/%Y')
-    df['Data'] = pd.to_datetime(df['Data'], format='%Y-%m-%d')
-    assert (df['Data'] == ref_date).all(), 'Erro data ref buscada'
-    df.set_index('DataReferencia', verify_integrity=True, inplace=True)
-    # sort:
-    df.sort_index(inplace=True)
-    return df
+    return _expect_mensal('IGP-M', ref_date)
 
 
 if __name__ == '__main__':
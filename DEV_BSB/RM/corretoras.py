@@ -39,13 +39,21 @@ def load(which, start_date, end_date=None):
         calls_available = [f.split('.')[0] for f in listdir(_ROOT_DIR)]
         raise ValueError(f'Calls disponíveis: {calls_available}')
 
-    df = pd.read_csv(filepath, sep=';', parse_dates=['DATACAPTURA'])
-    df = df.loc[(df['DATACAPTURA'] >= start_date)
-                & (df['DATACAPTURA'] < end_date)]
-    # parse additional date columns:
+    # read in chunks, keeping only the rows in the requested period,
+    # so the whole file is never held in memory at once. This replaces the
+    # pyarrow engine read: it has no chunksize, and parsing every date
+    # column of the whole file costs more than the period's rows need
+    chunks = pd.read_csv(filepath, sep=';', parse_dates=['DATACAPTURA'],
+                         chunksize=200_000)
+    df = pd.concat([
+        chunk.loc[(chunk['DATACAPTURA'] >= start_date)
+                  & (chunk['DATACAPTURA'] < end_date)]
+        for chunk in chunks
+    ])
+    # parse additional date columns, only for the selected rows:
     for col in ('MATURITY', 'DATAD2'):
         if col in df.columns:
-            df.loc[:, col] = pd.to_datetime(df[col])
+            df[col] = pd.to_datetime(df[col])
     return df
 
 
@@ -4,16 +4,21 @@ DATAMART DIRECT LOAD FROM MOBKP
 
 # Python
 import os
+import json
 import zipfile
 import ftplib
 import fnmatch
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
 
 # External
 import pandas as pd
 import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
 
 # Project
-from .utils import dead_filter, portfolio_filter, expired_filter
+from .utils import KEY_COLS, dead_filter, expired_filter
 
 
 __all__ = ['Datamart', 'BondViews', 'load']
@@ -35,7 +40,15 @@ class Datamart:
         else:
             self.ftp_folder = None
 
-    def ftp_download(self, pattern):
+    @staticmethod
+    def _ftp_connect():
+        """Opens a FTP connection, already in the datamart directory"""
+        ftp = ftplib.FTP(host='SIBRPROD', user='ftpmxmd', passwd='ftpmxmd')
+        # diretório Datamart
+        ftp.cwd('/sistemas/home/plbrasil/DATAMART_MX3')
+        return ftp
+
+    def ftp_download(self, pattern, max_workers=6):
         """
         Download datamart file(s) directly from FTP and save locally
 
@@ -44,30 +57,40 @@ class Datamart:
         pattern: str
             The pattern string. See
             https://docs.python.org/3/library/fnmatch.html
+        max_workers: int
+            Maximum number of files downloaded in parallel, each one
+            in its own FTP connection
         """
         if self.ftp_folder is None:
             raise OSError('TEMP environment variable not found')
         if not os.path.isdir(self.ftp_folder):
             os.mkdir(self.ftp_folder)
 
-        with ftplib.FTP(host='SIBRPROD', user='ftpmxmd', passwd='ftpmxmd') as ftp:
-            # diretório Datamart
-            ftp.cwd('/sistemas/home/plbrasil/DATAMART_MX3')
-
+        with self._ftp_connect() as ftp:
             # find files to download based on pattern given
             files = fnmatch.filter(ftp.nlst(), pattern)
-            if not files:
-                raise FileNotFoundError(f'Found no files in datamart matching pattern "{pattern}"')
-
-            # download requested files (takes a while for each one...)
-            for file in files:
-                to_filepath = os.path.join(self.ftp_folder, file)
-                if not os.path.isfile(to_filepath):
-                    with open(to_filepath, 'wb') as f:
-                        print(f'Downloading {file}')
-                        ftp.retrbinary(f'RETR {file}', f.write)
-                else:
-                    print(f'Skipped {file}, already in {self.ftp_folder}')
+        if not files:
+            raise FileNotFoundError(f'Found no files in datamart matching pattern "{pattern}"')
+
+        # skip the files already downloaded before going parallel:
+        to_download = []
+        for file in files:
+            if os.path.isfile(os.path.join(self.ftp_folder, file)):
+                print(f'Skipped {file}, already in {self.ftp_folder}')
+            else:
+                to_download.append(file)
+
+        def download(file):
+            to_filepath = os.path.join(self.ftp_folder, file)
+            with self._ftp_connect() as ftp, open(to_filepath, 'wb') as f:
+                print(f'Downloading {file}')
+                ftp.retrbinary(f'RETR {file}', f.write)
+
+        # download requested files (takes a while for each one...), the
+        # transfers are network bound, so they're done concurrently
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            # consume the results, so download errors are raised here
+            list(executor.map(download, to_download))
 
     @staticmethod
     def _clean_frame(df) -> None:
@@ -78,8 +101,20 @@ class Datamart:
         # this may include python objects, other than str (what we want),
         # but it probably won't happen
         obj_cols = df.select_dtypes(np.object_).columns
+        for col in obj_cols:
+            # strip with arrow's vectorized utf8 kernel, falling back to
+            # pandas' str.strip when the column is not made of strings only
+            try:
+                arr = pa.array(df[col], from_pandas=True)
+            except (pa.ArrowInvalid, pa.ArrowTypeError):
+                arr = None
+            if arr is not None and (pa.types.is_string(arr.type)
+                                    or pa.types.is_large_string(arr.type)):
+                df[col] = pc.utf8_trim_whitespace(arr) \
+                            .to_numpy(zero_copy_only=False)
+            else:
+                df[col] = df[col].str.strip()
         if not obj_cols.empty:
-            df[obj_cols] = df[obj_cols].apply(lambda s: s.str.strip())
             print(f'Stripped {len(obj_cols)} cols')
 
         # Parse dates:
@@ -100,7 +135,24 @@ class Datamart:
             if date_col in df.columns:
                 df[date_col] = pd.to_datetime(df[date_col], format=fmt)
 
-    def load(self, which: str, ref_date, *, cleanup=True) -> pd.DataFrame:
+    @staticmethod
+    def _set_categoricals(df, categorical) -> None:
+        """
+        Converts a few low cardinality columns to categoricals, for cheaper
+        filtering, or back to their plain dtype if not categorical
+        """
+        for col in ('STATUSLIVEMKT_OPDEAD', 'PORTFOLIO',
+                    'CONTRACTTYPOLOGY', 'BUYSELL'):
+            if col not in df.columns:
+                continue
+            is_cat = isinstance(df[col].dtype, pd.CategoricalDtype)
+            if categorical and not is_cat:
+                df[col] = df[col].astype('category')
+            elif not categorical and is_cat:
+                df[col] = df[col].astype(df[col].cat.categories.dtype)
+
+    def load(self, which: str, ref_date, *, cleanup=True,
+             columns=None, categorical=False) -> pd.DataFrame:
         """
         Load a datamart csv file from MOBKP network dir
 
@@ -109,13 +161,56 @@ class Datamart:
         :param ref_date: str or datetime-like
             The reference date
         :param cleanup: bool
-            Apply str.strip to columns with str dtype
+            Apply str.strip to columns with str dtype and parse dates
+        :param columns: list, optional
+            Columns to load. Only these columns are parsed from the
+            csv (default all)
+        :param categorical: bool, default False
+            With cleanup, return the STATUSLIVEMKT_OPDEAD, PORTFOLIO,
+            CONTRACTTYPOLOGY and BUYSELL columns as categoricals, which
+            makes dead_filter and portfolio_filter cheaper
         :return: pandas.DataFrame
             The csv file in a dataframe
+
+        Cleaned up frames are cached as parquet files in
+        TEMP/Datamart/parquet, so later loads of the same file skip
+        the csv parsing. The cache is refreshed if the source csv/zip
+        is newer than it.
         """
         which = which.upper()
         ref_date_str = pd.Timestamp(ref_date).strftime("%Y%m%d")
         csv_fname = f'{which}_{ref_date_str}.csv'
+        zip_fname = f'{which}_{ref_date_str}.zip'
+
+        def source_mtime():
+            """Modification time of the source file, None if not found"""
+            lookup = [os.path.join(self.root_folder, csv_fname),
+                      os.path.join(self.root_folder, zip_fname)]
+            if self.ftp_folder is not None:
+                lookup.append(os.path.join(self.ftp_folder, csv_fname))
+            for fpath in lookup:
+                if os.path.isfile(fpath):
+                    return os.path.getmtime(fpath)
+            return None
+
+        # parquet cache lookup (only cleaned up frames are cached):
+        cache_fpath = None
+        if cleanup and self.ftp_folder is not None:
+            cache_fpath = os.path.join(self.ftp_folder, 'parquet',
+                                       f'{which}_{ref_date_str}.parquet')
+            if os.path.isfile(cache_fpath):
+                src_mtime = source_mtime()
+                if src_mtime is None \
+                        or src_mtime <= os.path.getmtime(cache_fpath):
+                    try:
+                        df = pd.read_parquet(cache_fpath, columns=columns)
+                    except (OSError, ValueError) as e:
+                        # e.g. a broken cache file: parse the source again
+                        print(f'Could not read parquet cache: {e}')
+                    else:
+                        print('Located parquet cache')
+                        self._set_categoricals(df, categorical)
+                        return df
 
         def find_file():
             """Tries to find the goddamn datamart file somewhere"""
@@ -124,7 +219,7 @@ class Datamart:
             if os.path.isfile(csv_fpath):
                 print('Located csv')
                 return csv_fpath
-            zip_fpath = os.path.join(self.root_folder, f'{which}_{ref_date_str}.zip')
+            zip_fpath = os.path.join(self.root_folder, zip_fname)
             if os.path.isfile(zip_fpath):
                 print('Located zip')
                 with zipfile.ZipFile(zip_fpath) as zipf:
@@ -139,13 +234,45 @@ class Datamart:
                 self.ftp_download(csv_fname)
                 return local_fpath
 
-        read_csv_kwargs = dict(sep=';', error_bad_lines=False)
-
-        df = pd.read_csv(find_file(), **read_csv_kwargs)
+        # when caching, the whole file is read (and cached), and only then
+        # the requested columns are selected
+        usecols = columns if cache_fpath is None else None
+        src = find_file()
+        read_csv_kwargs = dict(sep=';', on_bad_lines='skip', engine='c',
+                               chunksize=500_000, usecols=usecols,
+                               # memory map files on disk (not applicable
+                               # to the file handles opened from zips)
+                               memory_map=isinstance(src, str))
+
+        # read the file in chunks, cleaning each one right after it's read,
+        # so we never hold the whole raw frame and its cleaned copy at once
+        chunks = []
+        for chunk in pd.read_csv(src, **read_csv_kwargs):
+            if cleanup:
+                self._clean_frame(chunk)
+            chunks.append(chunk)
+        df = pd.concat(chunks, ignore_index=True)
+
+        if cache_fpath is not None:
+            # written to a temporary file and then renamed, so other
+            # sessions never read a partial file
+            os.makedirs(os.path.dirname(cache_fpath), exist_ok=True)
+            tmp_fpath = f'{cache_fpath}.{os.getpid()}.tmp'
+            try:
+                df.to_parquet(tmp_fpath, compression='zstd', index=False)
+                os.replace(tmp_fpath, cache_fpath)
+            except (pa.ArrowInvalid, pa.ArrowTypeError) as e:
+                # e.g. columns with mixed types: just don't cache the file
+                print(f'Could not cache {csv_fname}: {e}')
+            finally:
+                if os.path.isfile(tmp_fpath):
+                    os.remove(tmp_fpath)
+            if columns is not None:
+                df = df.loc[:, columns]
 
         if cleanup:
-            self._clean_frame(df)
-
+            # done after the concat, so all chunks share the same categories
+            self._set_categoricals(df, categorical)
         return df
 
     @property
@@ -156,14 +283,41 @@ class Datamart:
         method.
         """
         # we cache the available file types because searching
-        # the entire directory takes a bit of time
+        # the entire directory takes a bit of time. The scan is also
+        # cached on disk, keyed by the directory's mtime, so new sessions
+        # only rescan it when files were added/removed
         if self._file_types_cache is None:
+            mtime = os.stat(self.root_folder).st_mtime_ns
+            cache_fpath = None
+            if self.ftp_folder is not None:
+                cache_fpath = os.path.join(self.ftp_folder,
+                                           '.file_types_cache.json')
+                try:
+                    with open(cache_fpath) as f:
+                        cached = json.load(f)
+                    if cached['mtime'] == mtime:
+                        self._file_types_cache = set(cached['names'])
+                        return self._file_types_cache
+                except (OSError, ValueError, KeyError, TypeError):
+                    # no cache yet, or a broken/outdated one: rescan
+                    pass
+
             self._file_types_cache = set(
                 f.name.rsplit('_', 1)[0]
                 for f in os.scandir(self.root_folder)
                 if f.name.endswith('.zip')
             )
             print(f'{self.root_folder} scanned')
+
+            if cache_fpath is not None:
+                # written to a temporary file and then renamed, so other
+                # sessions never read a partial file
+                os.makedirs(self.ftp_folder, exist_ok=True)
+                tmp_fpath = f'{cache_fpath}.{os.getpid()}.tmp'
+                with open(tmp_fpath, 'w') as f:
+                    json.dump({'mtime': mtime,
+                               'names': sorted(self._file_types_cache)}, f)
+                os.replace(tmp_fpath, cache_fpath)
         return self._file_types_cache
 
 
@@ -172,8 +326,21 @@ class Datamart:
 _DM = Datamart()  # Datamart instance for internal use
 
 
-def load(which, ref_date, *, cleanup=True):
-    return _DM.load(which, ref_date, cleanup=cleanup)
+@lru_cache(maxsize=2)
+def _cached_load(which, ref_date, cleanup, columns, categorical):
+    columns = None if columns is None else list(columns)
+    return _DM.load(which, ref_date, cleanup=cleanup, columns=columns,
+                    categorical=categorical)
+
+
+def load(which, ref_date, *, cleanup=True, columns=None, categorical=False):
+    # repeated loads of the last files are served from memory. A deep
+    # copy is returned, so callers editing the frame in place don't touch
+    # the cached one
+    columns = None if columns is None else tuple(columns)
+    df = _cached_load(which.upper(), pd.Timestamp(ref_date), cleanup, columns,
+                      categorical)
+    return df.copy()
 
 
 # ------------ development ------------
@@ -183,13 +350,23 @@ class BondViews:
     """Quick bond routine data grouping"""
     def __init__(self, ref_date):
         self.ref_date = pd.Timestamp(ref_date)
-        self.df = load('MOPL_BR_BO', ref_date)
+        # only the columns used by the views are parsed:
+        self.df = load('MOPL_BR_BO', ref_date,
+                       columns=KEY_COLS + ['STATUSLIVEMKT_OPDEAD'])
+        # the dead and expired filters don't depend on the view, so they're
+        # applied once, in a small frame with only the columns the views use
+        self._core = self.df.pipe(dead_filter) \
+                            .pipe(expired_filter, self.ref_date) \
+                            .loc[:, ['PORTFOLIO', 'INSTRUMENT', 'LIVEQUANTITY']]
 
     def _filter_and_sort(self, portfolios) -> pd.Series:
-        s = self.df.pipe(dead_filter) \
-                   .pipe(portfolio_filter, portfolios) \
-                   .pipe(expired_filter, self.ref_date) \
-                   .groupby('INSTRUMENT')['LIVEQUANTITY'].sum()
+        # only the portfolio filter is left, and its mask selects only the
+        # two grouped columns
+        if isinstance(portfolios, str):
+            portfolios = [portfolios]
+        df = self._core
+        mask = df['PORTFOLIO'].isin(portfolios).to_numpy()
+        s = df['LIVEQUANTITY'][mask].groupby(df['INSTRUMENT'][mask]).sum()
         return s.loc[s != 0].sort_values(ascending=False)
 
     def debs_mm(self):
@@ -222,9 +399,12 @@ class EqViews:
         self.df = load('MOPL_BR_EQ', ref_date)
 
     def position(self):
-        pdf = dead_filter(self.df)
-        pdf = pdf.loc[pdf['CONTRACTTYPOLOGY'] == 'Equity']
-        s = pdf.groupby(['INSTRUMENT'])['LIVEQUANTITY'].sum()
+        # dead and equity filters in a single mask, selecting only the
+        # grouped columns
+        df = self.df
+        mask = (df['STATUSLIVEMKT_OPDEAD'] != 'DEAD').to_numpy() \
+            & (df['CONTRACTTYPOLOGY'] == 'Equity').to_numpy()
+        s = df['LIVEQUANTITY'][mask].groupby(df['INSTRUMENT'][mask]).sum()
 
         return s.loc[s != 0].sort_values(ascending=False)
 
@@ -232,9 +412,9 @@ class EqViews:
 def inst_roll(df, inst):
     # test
     """Acumulado da posição de um instrumeto específico ao longo do tempo"""
-    inst_df = df.loc[df['INSTRUMENT'] == inst]
-    inst_df = inst_df.loc[inst_df['STATUSLIVEMKT_OPDEAD'] != 'DEAD']
-    return inst_df.groupby(['TRNDATE'])['LIVEQUANTITY'].sum().cumsum()
+    mask = (df['INSTRUMENT'] == inst).to_numpy() \
+        & (df['STATUSLIVEMKT_OPDEAD'] != 'DEAD').to_numpy()
+    return df['LIVEQUANTITY'][mask].groupby(df['TRNDATE'][mask]).sum().cumsum()
 
 
 
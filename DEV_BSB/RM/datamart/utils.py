@@ -4,6 +4,7 @@ Helper functions
 
 from typing import Union, List
 
+import numpy as np
 import pandas as pd
 
 
@@ -82,7 +83,13 @@ def dead_filter(df: pd.DataFrame):
     if 'STATUSLIVEMKT_OPDEAD' not in df.columns:
         print(f'No STATUSLIVEMKT_OPDEAD column!')
         return df
-    return df.loc[df['STATUSLIVEMKT_OPDEAD'] != 'DEAD']
+    status = df['STATUSLIVEMKT_OPDEAD']
+    if isinstance(status.dtype, pd.CategoricalDtype):
+        # compare the integer codes instead of the strings
+        if 'DEAD' not in status.cat.categories:
+            return df
+        return df.loc[status.cat.codes != status.cat.categories.get_loc('DEAD')]
+    return df.loc[status != 'DEAD']
 
 
 def portfolio_filter(df: pd.DataFrame, portfolios: Union[str, List[str]]):
@@ -95,7 +102,15 @@ def portfolio_filter(df: pd.DataFrame, portfolios: Union[str, List[str]]):
 
     if isinstance(portfolios, str):
         portfolios = [portfolios]
-    return df.loc[df['PORTFOLIO'].isin(portfolios)]
+    portfolio = df['PORTFOLIO']
+    if isinstance(portfolio.dtype, pd.CategoricalDtype):
+        # lookup of the (few) requested portfolios' codes, so the
+        # isin is done over the integer codes instead of the strings
+        cats = portfolio.cat.categories
+        codes = np.array([cats.get_loc(p) for p in portfolios if p in cats],
+                         dtype=portfolio.cat.codes.dtype)
+        return df.loc[np.isin(portfolio.cat.codes.to_numpy(), codes)]
+    return df.loc[portfolio.isin(portfolios)]
 
 
 def expired_filter(df: pd.DataFrame, ref_date):
@@ -2,11 +2,16 @@
 Carrega algum tipo de Sensmap
 """
 
+import os
 from os import path
 import warnings
 
 import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+from pyarrow import csv as pacsv
 
 warnings.simplefilter('always')
 
@@ -18,21 +23,104 @@ def _invert_dict(dikt):
     valor sua key original. Necessário que todos os valores
     de todos os iterable sejam únicos.
     """
-    # dupes check (mesmo valores mapeando para mais de uma chave)
+    # dupes check (mesmo valores mapeando para mais de uma chave),
+    # feito na mesma passada da inversão
     err_msg = 'Mapeamentos inconsistentes / duplicados'
-    assert ~pd.Series([v for k in dikt for v in dikt[k]]).duplicated().any(), err_msg
-
     inv_dikt = dict()
     for key, iterable in dikt.items():
         for item in iterable:
+            assert item not in inv_dikt, err_msg
             inv_dikt[item] = key
     return inv_dikt
 
 
+def _read_csv(filepath, columns=None, column_types=None):
+    """
+    Lê um csv de sensmap com o leitor multithread do pyarrow. Campos
+    vazios são lidos como nulos, como no pd.read_csv
+    """
+    table = pacsv.read_csv(
+        filepath,
+        read_options=pacsv.ReadOptions(use_threads=True, block_size=8 << 20),
+        parse_options=pacsv.ParseOptions(delimiter=';'),
+        convert_options=pacsv.ConvertOptions(
+            include_columns=columns,
+            column_types=column_types,
+            strings_can_be_null=True,
+        ),
+    )
+    # colunas inteiramente vazias são lidas como float NaN, como no pandas
+    table = table.cast(pa.schema([
+        pa.field(f.name, pa.float64()) if pa.types.is_null(f.type) else f
+        for f in table.schema
+    ]))
+    return table.to_pandas()
+
+
+def _filters(criteria, risk):
+    """Filtros de CRITERIA e RISK dados, no formato {coluna: [valores]}"""
+    return {
+        col: [values] if isinstance(values, str) else list(values)
+        for col, values in (('CRITERIA', criteria), ('RISK', risk))
+        if values is not None
+    }
+
+
+def _read_parquet(filepath, filters):
+    """
+    Lê a sensmap do cache em parquet, aplicando os filtros na
+    própria leitura (só as linhas selecionadas são materializadas)
+    """
+    expr = None
+    for col, values in filters.items():
+        cond = ds.field(col).isin(values)
+        expr = cond if expr is None else expr & cond
+    return ds.dataset(filepath, format='parquet').to_table(filter=expr).to_pandas()
+
+
+def _parse(filepath, which):
+    """
+    Lê do csv de sensmap só as colunas úteis, com os nomes em maiúsculas.
+    Os mapeamentos de risco e mesa não são aplicados aqui
+    """
+    # keep only a bunch useful columns:
+    usecols = []
+    if which == 'SENSMAP':
+        usecols = 'CRITERIA CRV_CODE TENOR_CODE SENS'.split()
+    elif which == 'SENSMAP_FVA':
+        usecols = 'CRITERIA CRV_CODE TENOR_CODE SENS ' \
+                  'PL_INSTRUMENT FAMILY ' \
+                  'GRUPO TYPE PORTFOLIO CALL_PUT'.split()
+
+    # peek the header (columns may come in any case), so only the useful
+    # columns are parsed, with their dtypes declared up front
+    header = pd.read_csv(filepath, sep=';', nrows=0).columns
+    if usecols:
+        file_cols = [col for col in header if col.upper() in usecols]
+    else:
+        file_cols = list(header)
+    dtype = {col: pa.float64() for col in file_cols if col.upper() == 'SENS'}
+    if which == 'SENSMAP_FVA':
+        dtype.update({col: pa.string() for col in file_cols
+                      if col.upper() == 'TYPE'})
+
+    df = _read_csv(filepath, columns=file_cols, column_types=dtype)
+
+    # uppercase columns, in the usecols order:
+    df.columns = df.columns.str.upper()
+    if usecols:
+        df = df.loc[:, [v for v in usecols if v in df.columns]]
+    return df
+
+
 # -------- constantes -------------
 
 _ROOT_FOLDER = r'\\mscluster34fs\RM_RF\BHA'
 
+# pasta do cache local (TEMP/Sensmap/colunas) das colunas lidas das sensmaps
+_CACHE_FOLDER = path.join(os.environ['TEMP'], 'Sensmap', 'colunas') \
+    if 'TEMP' in os.environ else None
+
 # Mapa de Fator_de_Risco para CRV_CODE.
 # Preencher manualmente quando necessário.
 _RISK_TO_CRVCODE = {
@@ -167,8 +255,15 @@ _RISK_TO_CRVCODE = {
 # inversão do dict acima
 _CRVCODE_TO_RISK = _invert_dict(_RISK_TO_CRVCODE)
 
+# o mesmo mapeamento, indexado: os CRV_CODE são mapeados p/ risco pela
+# posição no índice. O último risco (NaN) corresponde aos CRV_CODE sem
+# mapeamento (posição -1)
+_CRVCODES = pd.Index(list(_CRVCODE_TO_RISK))
+_RISK_BY_CODE = np.array([_CRVCODE_TO_RISK[c] for c in _CRVCODES] + [np.nan],
+                         dtype=object)
 
-def load(which, ref_date, *, raw=False):
+
+def load(which, ref_date, *, raw=False, criteria=None, risk=None):
     """
     Carrega um arquivo csv de sensmap
 
@@ -182,6 +277,10 @@ def load(which, ref_date, *, raw=False):
         Se True retorna a sensmap original. Se False (default), faz um cleanup
         na sensmap e adiciona colunas auxiliares, dependendo do tipo de sensmap.
         Útil para a sensmap fva.
+    criteria: str or list, optional
+        Filtra as linhas pelo(s) CRITERIA dado(s). Só se raw=False
+    risk: str or list, optional
+        Filtra as linhas pelo(s) RISK dado(s). Só se raw=False
 
     Returns
     -------
@@ -217,33 +316,49 @@ def load(which, ref_date, *, raw=False):
 
         raise FileNotFoundError(f"Could not find file {filename} anywhere")
 
-    # this avoids pandas dtypewarning because TYPE columns has empty fields
-    # interpreted as NaNs
-    dtype = {'TYPE': str} if which == 'SENSMAP_FVA' else None
-    # read the whole thing
-    df = pd.read_csv(find_file(), sep=';', dtype=dtype)
-
+    filepath = find_file()
     if raw:
-        return df
+        # read the whole thing, as pandas does (pyarrow's type inference
+        # would change some dtypes). This avoids pandas dtypewarning because
+        # TYPE columns has empty fields interpreted as NaNs
+        dtype = {'TYPE': str} if which == 'SENSMAP_FVA' else None
+        return pd.read_csv(filepath, sep=';', dtype=dtype)
+
+    # as colunas lidas do csv, ainda sem os mapeamentos (que são editados à
+    # mão), ficam em cache em parquet (refeito se o csv for mais novo). O
+    # filtro de CRITERIA é aplicado direto na leitura do cache, exceto na
+    # sensmap fva, cujas checagens entre mesas precisam de todos os CRITERIA
+    filters = _filters(criteria, risk)
+    cache_filters = {} if which == 'SENSMAP_FVA' else \
+        {col: values for col, values in filters.items() if col == 'CRITERIA'}
+    cache_fpath = None
+    if _CACHE_FOLDER is not None:
+        cache_fpath = path.join(_CACHE_FOLDER, filename.replace('.csv', '.parquet'))
+    df = None
+    if cache_fpath is not None and path.isfile(cache_fpath) \
+            and path.getmtime(filepath) <= path.getmtime(cache_fpath):
+        try:
+            df = _read_parquet(cache_fpath, cache_filters)
+            print('Located parquet cache')
+        except (OSError, ValueError) as e:
+            # e.g. um cache corrompido: lê o csv de novo
+            print(f'Could not read parquet cache: {e}')
+    if df is None:
+        df = _parse(filepath, which)
+        if cache_fpath is not None:
+            # escrito num arquivo temporário e depois renomeado, p/ que
+            # outras sessões nunca leiam um arquivo incompleto
+            os.makedirs(_CACHE_FOLDER, exist_ok=True)
+            tmp_fpath = f'{cache_fpath}.{os.getpid()}.tmp'
+            try:
+                df.to_parquet(tmp_fpath)
+                os.replace(tmp_fpath, cache_fpath)
+            finally:
+                if path.isfile(tmp_fpath):
+                    os.remove(tmp_fpath)
 
     # ---- cleaning up the sens and adding info to it ----
 
-    # uppercase columns:
-    df.columns = df.columns.str.upper()
-
-    # keep only a bunch useful columns:
-    usecols = []
-    if which == 'SENSMAP':
-        usecols = 'CRITERIA CRV_CODE TENOR_CODE SENS'.split()
-    elif which == 'SENSMAP_FVA':
-        usecols = 'CRITERIA CRV_CODE TENOR_CODE SENS ' \
-                  'PL_INSTRUMENT FAMILY ' \
-                  'GRUPO TYPE PORTFOLIO CALL_PUT'.split()
-
-    if usecols:
-        new_cols = [v for v in usecols if v in df.columns]
-        df = df.loc[:, new_cols]
-
     if 'CRV_CODE' in df.columns:
         # drop NaNs CRV_CODE's (sujeira, segundo Quixadá,
         # sempre aparece nos 2 últimos dias do mês)
@@ -254,7 +369,7 @@ def load(which, ref_date, *, raw=False):
             print(f'Dropped {n_rows_dropped} rows with null CRV_CODE field')
 
         # mapear riscos:
-        df['RISK'] = df['CRV_CODE'].map(_CRVCODE_TO_RISK)
+        df['RISK'] = _RISK_BY_CODE[_CRVCODES.get_indexer(df['CRV_CODE'])]
 
         if not df[pd.isna(df.RISK)].empty:
             missings = df[pd.isna(df['RISK'])]['CRV_CODE'].unique()
@@ -266,8 +381,12 @@ def load(which, ref_date, *, raw=False):
         # adicionar campo INST_KEY "familia&grupo&tipo&inst"
         if 'TYPE' in df.columns:
             df['TYPE'] = df['TYPE'].fillna('')  # sometimes TYPE is NaN
-            df['INST_KEY'] = df['FAMILY'] + '&' + df['GRUPO'] + '&' \
-                             + df['TYPE'] + '&' + df['PL_INSTRUMENT']
+            # join numa passada só, com o kernel do arrow (nulos continuam
+            # resultando em nulo, como na soma de strings do pandas)
+            key_cols = [pa.array(df[col], type=pa.string(), from_pandas=True)
+                        for col in ('FAMILY', 'GRUPO', 'TYPE', 'PL_INSTRUMENT')]
+            df['INST_KEY'] = pc.binary_join_element_wise(*key_cols, '&') \
+                               .to_numpy(zero_copy_only=False)
 
         # adicionar campo DESK, a partir do CRITERIA:
         if 'CRITERIA' in df.columns:
@@ -322,44 +441,52 @@ def load(which, ref_date, *, raw=False):
             criteria_to_desk = _invert_dict(desk_to_criteria)
             df['DESK'] = df['CRITERIA'].map(criteria_to_desk)
 
+            # as somas por risco e vértice das duas checagens abaixo são
+            # acumuladas numa passada só, cada linha na coluna do seu grupo:
+            # 0: TOTAL TESORERIA, 1: MARKET MAKING, 2: FT, 3: MM, 4: PT e ACPM
+            group = df.groupby(['RISK', 'TENOR_CODE']).ngroup() \
+                      .fillna(-1).to_numpy(dtype=np.int64)
+            criteria, desk = df['CRITERIA'].to_numpy(), df['DESK'].to_numpy()
+            bucket = np.select(
+                [criteria == 'TOTAL TESORERIA', criteria == 'MARKET MAKING',
+                 desk == 'FT', desk == 'MM', np.isin(desk, ['PT', 'ACPM'])],
+                [0, 1, 2, 3, 4], default=-1,
+            )
+            # grupo -1 (ou NaN): risco/vértice nulo. SENS nulas são puladas,
+            # como na soma do groupby
+            sens = df['SENS'].to_numpy(dtype=np.float64)
+            sel = (group >= 0) & (bucket >= 0) & ~np.isnan(sens)
+            acc = np.zeros((group.max(initial=-1) + 1, 5))
+            np.add.at(acc, (group[sel], bucket[sel]), sens[sel])
+            tes, mm, mm_flow, mm_noflow, other_desks = acc.T
+
             # garantir a soma das sensibilidades mesas da tesouria
             # equivalente ao criteria 'TOTAL TESORERIA', por
             # risco e vértice:
-            tes_desks = ['MM', 'FT', 'PT', 'ACPM']
-            tes_sens = df.loc[df['CRITERIA'] == 'TOTAL TESORERIA']
-            desk_sens = df.loc[df['DESK'].isin(tes_desks)]
-
-            df1 = tes_sens.groupby(['RISK', 'TENOR_CODE'])['SENS'].sum()
-            df2 = desk_sens.groupby(['RISK', 'TENOR_CODE'])['SENS'].sum()
-            if not np.allclose(df1, df2, rtol=0, atol=1.e-5):
-                diff = (df2 - df1).sum()
+            desks = mm_flow + mm_noflow + other_desks
+            if not np.allclose(tes, desks, rtol=0, atol=1.e-5):
+                diff = (desks - tes).sum()
                 warnings.warn("Verificar sensibilidades distorcidas entre mesas"
                               f" e TOTAL TESORERIA, abrindo {diff}", stacklevel=2)
 
             # garantir quebra correta de market making entre flow e no-flow:
             # mm no flow + mm flow = MarketMaking criteria
-            mm = df.loc[df['CRITERIA'] == 'MARKET MAKING']
-            mm_flow = df.loc[df['DESK'] == 'FT'].groupby(['RISK', 'TENOR_CODE'])['SENS'].sum()
-            mm_noflow = df.loc[df['DESK'] == 'MM'].groupby(['RISK', 'TENOR_CODE'])['SENS'].sum()
-
-            df1 = mm.groupby(['RISK', 'TENOR_CODE'])['SENS'].sum()
-            df2 = mm_flow.add(mm_noflow, fill_value=0)
-            if not np.allclose(df1, df2, rtol=0, atol=1.e-5):
-                diff = (df2 - df1).sum()
+            if not np.allclose(mm, mm_flow + mm_noflow, rtol=0, atol=1.e-5):
+                diff = (mm_flow + mm_noflow - mm).sum()
                 warnings.warn("Verificar sensibilidades MM NO FLOW + MM FLOW != MARKET MAKING, "
                               f"abrindo {diff}", stacklevel=2)
 
+    for col, values in filters.items():
+        df = df.loc[df[col].isin(values)]
+
     return df
 
 
 def _bater_sensmap_sensmapfva(ref_date):
     """Bater as sensibilidades SENSMAP & SENSMAP_FVA da tesouraria"""
     ref_date = '2020-01-31'
-    sm = load('SENSMAP', ref_date)
-    sfva = load('SENSMAP_FVA', ref_date)
-
-    sm = sm.loc[sm['CRITERIA'] == 'TOTAL TESORERIA']
-    sfva = sfva.loc[sfva['CRITERIA'] == 'TOTAL TESORERIA']
+    sm = load('SENSMAP', ref_date, criteria='TOTAL TESORERIA')
+    sfva = load('SENSMAP_FVA', ref_date, criteria='TOTAL TESORERIA')
 
     sm_pre = sm.loc[sm['RISK'] == 'PRE']
     sfva_pre = sfva.loc[sfva['RISK'] == 'PRE']
@@ -22,9 +22,24 @@ class CSVDataAppender:
     def __init__(self, filepath: str):
         self.filepath = filepath
         self.filename = os.path.basename(filepath)
-        self.df = pd.read_csv(filepath, sep=';', header=0, parse_dates=[0], index_col=0,
+        self._df = pd.read_csv(filepath, sep=';', header=0, parse_dates=[0], index_col=0,
                               date_parser=lambda v: pd.to_datetime(v, format="%Y-%m-%d"))
         self.csv_modified = False  # signal to save the csv only if it has been modified
+        # appended rows are buffered, and only concatenated to the frame
+        # when it's accessed through ``df`` or on commit (a .loc enlargement
+        # per row reallocates the whole frame)
+        self._pending = {}  # {date: row}
+
+    @property
+    def df(self) -> pd.DataFrame:
+        """The csv data, including the rows appended so far"""
+        self._flush()
+        return self._df
+
+    @df.setter
+    def df(self, df: pd.DataFrame):
+        self._flush()
+        self._df = df
 
     def append_row(self, date, func: Callable):
         """
@@ -34,13 +49,22 @@ class CSVDataAppender:
         :param func: function to get the row values, given the date, i.e. row_values = func(date)
         """
         pd_date = pd.Timestamp(date)
-        if date in self.df.index:
+        if pd_date in self._df.index or pd_date in self._pending:
             print(f'CSVAppender skipping date {pd_date.strftime("%Y-%m-%d")} for file {self.filename}')
         else:
             row_values = func(date)
-            self.df.loc[pd_date] = row_values
+            # same broadcasting/alignment as a .loc row assignment
+            self._pending[pd_date] = pd.Series(row_values, index=self._df.columns, dtype=object)
             self.csv_modified = True
 
+    def _flush(self):
+        """Concatenates the buffered rows to the frame, in a single step"""
+        if self._pending:
+            new_df = pd.DataFrame(list(self._pending.values()),
+                                  index=pd.DatetimeIndex(list(self._pending), name=self._df.index.name))
+            self._df = pd.concat([self._df, new_df.infer_objects()])
+            self._pending = {}
+
     def commit(self):
         """Saves the appended csv, overwriting the file. Keeps date index in ascending order"""
         if self.csv_modified:
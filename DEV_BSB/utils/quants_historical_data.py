@@ -4,6 +4,7 @@ from os import path, scandir
 from xml.etree import ElementTree
 from functools import lru_cache
 
+import numpy as np
 import pandas as pd
 
 
@@ -17,16 +18,26 @@ def load_hist(product: str) -> pd.Series:
     pd.Series com os valores, indexado por data.
     """
     product = product.lower()
-    with open(path.join(ROOT_FOLDER, f'{product}.xml')) as f:
-        root = ElementTree.fromstring(f.read())
-
-    df = pd.DataFrame(((a, b) for (a, b) in root), columns=['DATE', 'VALUE'])
-    df = df.applymap(lambda v: v.text)
-    df = df.astype({'DATE': int, 'VALUE': float})
-    # excel date to timestamp:
-    df.DATE = df.DATE.apply(lambda v: pd.Timestamp('1899-12-30') + pd.DateOffset(days=v))
-    df = df.set_index('DATE')
-    return df['VALUE']
+    fpath = path.join(ROOT_FOLDER, f'{product}.xml')
+
+    # stream the xml rows (the root's children, each one with a date and a
+    # value), releasing each row after it's read:
+    dates, values = [], []
+    depth = 0
+    for event, elem in ElementTree.iterparse(fpath, events=('start', 'end')):
+        if event == 'start':
+            depth += 1
+            continue
+        depth -= 1
+        if depth == 1:
+            date, value = elem
+            dates.append(date.text)
+            values.append(value.text)
+            elem.clear()
+
+    # excel date to timestamp, in a single vectorized step:
+    ix = pd.Timestamp('1899-12-30') + pd.to_timedelta(np.asarray(dates, dtype=int), unit='D')
+    return pd.Series(np.asarray(values, dtype=float), index=ix.rename('DATE'), name='VALUE')
 
 
 load_hist.available = pd.Index([
@@ -2,13 +2,15 @@
 Teste. Comparação entre os calendários IBox e original PCTools.xll
 """
 
+import array
 import datetime as dt
-from xml.etree import ElementTree
+import functools
 from os import path
 
 # External
 import numpy as np
 import pandas as pd
+from lxml import etree
 
 
 def xldate_to_datetime(xldate):
@@ -42,24 +44,64 @@ def xldate_to_datetime(xldate):
     return (epoch + dt.timedelta(days)).date()
 
 
+def xldates_to_datetime64(xldates):
+    """
+    Vectorized version of ``xldate_to_datetime``, for an array of
+    integer Excel dates
+
+    Parameters
+    ----------
+    xldates: array_like of int
+        The Excel date numbers
+
+    Returns
+    -------
+    np.ndarray of np.datetime64[D]
+    """
+    xldates = np.asarray(xldates, dtype=np.int32)
+    # same epochs as xldate_to_datetime (Excel 1900 leap year bug)
+    epochs = np.where(xldates < 60,
+                      np.datetime64('1899-12-31', 'D'),
+                      np.datetime64('1899-12-30', 'D'))
+    return epochs + xldates.astype('timedelta64[D]')
+
+
+def read_xldates(fpath):
+    """
+    Stream parses a calendar xml, returning the Excel dates in its root's
+    children as an int array. Parsed elements are released as we go, so
+    the whole tree is never held in memory
+    """
+    xldates = array.array('i')
+    # parser options: no limits on text size (so the date texts aren't
+    # split), no id hash table, and no blank text / comment nodes
+    context = etree.iterparse(fpath, events=('end',), huge_tree=True,
+                              collect_ids=False, remove_blank_text=True,
+                              remove_comments=True)
+    for _, elem in context:
+        if elem.getparent() is None:
+            # the root element itself: all dates were read
+            break
+        xldates.append(int(elem.text))
+        elem.clear()
+        while elem.getprevious() is not None:
+            del elem.getparent()[0]
+    return np.frombuffer(xldates, dtype=np.intc)
+
+
+# each calendar's xml is parsed only once per session
+@functools.lru_cache(maxsize=64)
 def ibox_holidays(cal):
     folder = r'G:\Globo\deploy\IBox\PROD\XMLFiles\Calendars'
-    with open(path.join(folder, f'{cal}.xml')) as f:
-        data = f.read()
-    root = ElementTree.fromstring(data)
-    holidays = np.array([xldate_to_datetime(int(child.text))
-                         for child in root], dtype='datetime64[D]')
-    return np.busdaycalendar(holidays=holidays)
+    xldates = read_xldates(path.join(folder, f'{cal}.xml'))
+    return np.busdaycalendar(holidays=xldates_to_datetime64(xldates))
 
 
+@functools.lru_cache(maxsize=64)
 def pctools_holidays(cal):
     folder = r'C:\Users\t716584\PycharmProjects\DEV_pypctools\Calendars_PCTools_xll_original'
-    with open(path.join(folder, f'{cal}.xml')) as f:
-        data = f.read()
-    root = ElementTree.fromstring(data)
-    holidays = np.array([xldate_to_datetime(int(child.text))
-                         for child in root], dtype='datetime64[D]')
-    return np.busdaycalendar(holidays=holidays)
+    xldates = read_xldates(path.join(folder, f'{cal}.xml'))
+    return np.busdaycalendar(holidays=xldates_to_datetime64(xldates))
 
 
 c = 'EUR'
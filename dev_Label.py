@@ -10,6 +10,21 @@ from weakref import WeakValueDictionary
 import numpy as np
 import pandas as pd
 from pypctools.Calendar import offsetdate
+from pypctools.Bucket import _LETTER_ORDER
+
+
+_LABEL_RE = re.compile(r'(\d+)([YMWD])')
+
+
+# DateOffset objects are immutable, so the few distinct ones are reused
+@functools.lru_cache(maxsize=512)
+def _months_offset(n):
+    return pd.DateOffset(months=n)
+
+
+@functools.lru_cache(maxsize=512)
+def _days_offset(n):
+    return pd.DateOffset(days=n)
 
 
 class NewLabel(str):
@@ -18,10 +33,6 @@ class NewLabel(str):
     """
     __cache = WeakValueDictionary()
 
-    # constants needed for integrity checking
-    _single_label_pat = re.compile(r'(\d+)([YMWD])')
-    _letter_order_map = {'Y': 0, 'M': 1, 'W': 2, 'D': 3}
-
     def __new__(cls, label):
         """
         Implements caching and idempotence. See links for more information:
@@ -29,13 +40,10 @@ class NewLabel(str):
         https://stackoverflow.com/questions/53481937/python-creating-an-idempotent-initializer
         https://www.concentricsky.com/articles/detail/pythons-hidden-new
         """
-        print('__new__')
         if isinstance(label, cls):
-            print(f'Same class, returned new')
             return label
 
         if label in cls.__cache:
-            print(f'{label} returned from cache')
             return cls.__cache[label]
 
         # cache newly created object
@@ -43,10 +51,8 @@ class NewLabel(str):
         return label_obj
 
     def __init__(self, label):
-        print(f'__init__ received {label} of type {type(label)}')
         # idempotence: don't need to do __init__ all over again
         if isinstance(label, type(self)):
-            print('skipped __init__')
             return
 
         # ------ integrity checks -------
@@ -59,7 +65,7 @@ class NewLabel(str):
             raise ValueError(f'Given label "{label}" must be uppercase')
 
         # splitting label into vertices and consistency checks
-        match_list = self._single_label_pat.findall(label)
+        match_list = _LABEL_RE.findall(label)
         if not match_list:
             raise ValueError(f'Invalid label format: {label}')
 
@@ -83,7 +89,7 @@ class NewLabel(str):
 
         # assert letters are in order Y-M-W-D
         if len(letters) > 1:
-            mapped_letters = [self._letter_order_map[c] for c in letters]
+            mapped_letters = [_LETTER_ORDER[c] for c in letters]
             if sorted(mapped_letters) != mapped_letters:
                 raise ValueError(f'Label must be in Y-M-W-D order')
 
@@ -94,14 +100,10 @@ class NewLabel(str):
         self.letter_map = {'Y': 0, 'M': 0, 'W': 0, 'D': 0}
         for char, num in zip(letters, numbers):
             self.letter_map[char] = num
+        ny, nm, nw, nd = map(self.letter_map.get, 'YMWD')
 
         # day count used only for comparison methods
-        self.dc_count = sum(n * self.letter_map.get(c, 0)
-                            for n, c in zip((1, 7, 30, 360), 'DWMY'))
-        str.__init__(label)
-        print('__init__ finished')
-        # update cache with label's added attributes:
-        self.__cache[label] = self
+        self.dc_count = 360 * ny + 30 * nm + 7 * nw + nd
 
     def __repr__(self):
         return f'<Label {self}>'
@@ -150,9 +152,8 @@ class Label:
     """
     Creation of bucket label objects
     """
-    # constants needed for integrity checking
-    _single_label_pat = re.compile(r'(\d+)([YMWD])')
-    _letter_order_map = {'Y': 0, 'M': 1, 'W': 2, 'D': 3}
+    # no per-instance __dict__
+    __slots__ = ('_label', '_letter_map', '_dc_count', '__weakref__')
 
     def __new__(cls, *args, **kwargs):
         """
@@ -180,7 +181,7 @@ class Label:
             raise ValueError(f'Given label "{label}" must be uppercase')
 
         # splitting label into vertices and consistency checks
-        match_list = self._single_label_pat.findall(label)
+        match_list = _LABEL_RE.findall(label)
         if not match_list:
             raise ValueError(f'Invalid label format: {label}')
 
@@ -204,7 +205,7 @@ class Label:
 
         # assert letters are in order Y-M-W-D
         if len(letters) > 1:
-            mapped_letters = [self._letter_order_map[c] for c in letters]
+            mapped_letters = [_LETTER_ORDER[c] for c in letters]
             if sorted(mapped_letters) != mapped_letters:
                 raise ValueError(f'Label must be in Y-M-W-D order')
 
@@ -215,11 +216,11 @@ class Label:
         self._letter_map = {'Y': 0, 'M': 0, 'W': 0, 'D': 0}
         for char, num in zip(letters, numbers):
             self._letter_map[char] = num
+        ny, nm, nw, nd = map(self._letter_map.get, 'YMWD')
 
         self._label = label
         # day count used only for comparison methods
-        self._dc_count = sum(n * self._letter_map.get(c, 0)
-                             for n, c in zip((1, 7, 30, 360), 'DWMY'))
+        self._dc_count = 360 * ny + 30 * nm + 7 * nw + nd
 
     @property
     def label(self):
@@ -252,7 +253,8 @@ class Label:
         return self.label
 
     def __hash__(self):
-        return hash(repr(self))
+        # consistent with __eq__: equal labels have the same day count
+        return hash(self._dc_count)
 
     def to_date(self, ref_date, *, date_adjust, cal=None):
         """
@@ -298,14 +300,14 @@ class Label:
         shifted = ref_date
         if nm > 0:
             # jump months
-            shifted += pd.DateOffset(months=nm)
+            shifted += _months_offset(nm)
             if date_adjust == 'DU':
                 # Don't move to the next month if in EOM
                 shifted = pd.Timestamp(
                     offsetdate(shifted, 0, roll='modifiedfollowing', cal=cal)
                 )
         if nd > 0:
-            shifted += pd.DateOffset(days=nd)
+            shifted += _days_offset(nd)
             if date_adjust == 'DU':
                 shifted = offsetdate(shifted, 0, roll='forward', cal=cal)
 
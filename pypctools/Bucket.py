@@ -4,9 +4,9 @@ and distributing one set of bucket's values to another
 """
 
 # Python
-import re
 import functools
-from itertools import dropwhile
+from types import MappingProxyType
+from weakref import WeakValueDictionary
 
 # External
 import numpy as np
@@ -18,82 +18,168 @@ from pypctools.Calendar import offsetdate
 
 __all__ = ['Label', 'Bucket', 'labeltodate']
 
+# constants needed for label integrity checking
+_LETTER_ORDER = {'Y': 0, 'M': 1, 'W': 2, 'D': 3}
+# ascii code -> char class of the label parser: the letters' order,
+# _DIGIT_CLASS for digits and _INVALID_CLASS for everything else
+_DIGIT_CLASS = 4
+_INVALID_CLASS = 5
+_CHAR_CLASS = bytearray([_INVALID_CLASS]) * 256
+_CHAR_CLASS[ord('0'):ord('9') + 1] = bytes([_DIGIT_CLASS]) * 10
+for _letter, _order in _LETTER_ORDER.items():
+    _CHAR_CLASS[ord(_letter)] = _order
+_CHAR_CLASS = bytes(_CHAR_CLASS)
+del _letter, _order
+# whole label, one group per letter (used by Label.parse_many)
+_FULL_LABEL_PATTERN = r'^(?:([0-9]+)Y)?(?:([0-9]+)M)?(?:([0-9]+)W)?(?:([0-9]+)D)?\Z'
+
+# label string -> live Label instance, shared between constructions
+_label_cache = WeakValueDictionary()
+
+
+@functools.lru_cache(maxsize=1024)
+def _parse_label(label):
+    """
+    Checks the given label string and splits it into its number of
+    periods. Failed checks raise ValueError (and are not cached)
+
+    Returns
+    -------
+    tuple of int
+        The number of periods (years, months, weeks, days),
+        followed by the label's day count
+    """
+    # labels always start with a number: short-circuits most invalid strings
+    if not label[:1].isdecimal():
+        raise ValueError(f'Invalid label format: {label}')
+
+    # uppercase check
+    if not label.isupper():
+        raise ValueError(f'Given label "{label}" must be uppercase')
+
+    # labels are plain ascii
+    try:
+        label_bytes = label.encode('ascii')
+    except UnicodeEncodeError:
+        raise ValueError(f'Invalid label format: {label}') from None
+
+    # single pass state machine over the label's char classes: digits are
+    # accumulated until a period letter, whose order must be greater
+    # than the previous letter's (so no repeated letters and Y-M-W-D order)
+    periods = [0, 0, 0, 0]
+    state = -1
+    number = 0
+    has_digits = False
+    for code in label_bytes:
+        order = _CHAR_CLASS[code]
+        if order == _DIGIT_CLASS:
+            number = 10 * number + code - 48  # ord('0') == 48
+            has_digits = True
+            continue
+        if order == _INVALID_CLASS or not has_digits:
+            raise ValueError(f'Invalid label format: {label}')
+        if order == state:
+            raise ValueError(f'Repeated letters in given label: {label}')
+        if order < state:
+            raise ValueError(f'Label must be in Y-M-W-D order')
+        periods[order] = number
+        state = order
+        number = 0
+        has_digits = False
+
+    # label must end with a period letter
+    if has_digits:
+        raise ValueError(f'Invalid label format: {label}')
+
+    # FIXME: assert there are no labels with zero value
+
+    ny, nm, nw, nd = periods
+    return ny, nm, nw, nd, nd + 7 * nw + 30 * nm + 360 * ny
+
+
+def _check_date_adjust(date_adjust):
+    """
+    Type and value checks of the `date_adjust` parameter,
+    returns it in uppercase
+    """
+    if not isinstance(date_adjust, str):
+        raise TypeError(f'date_adjust parameter must be str, '
+                        f'got {date_adjust.__class__.__name__}')
+    date_adjust = date_adjust.upper()
+    if date_adjust not in {'DU', 'DC'}:
+        raise ValueError(f"date_adjust parameter must be "
+                         f"'DU' or 'DC', got '{date_adjust}'")
+    return date_adjust
+
+
+def _add_months(dates, months):
+    """
+    Shifts np.datetime64[D] date(s) by the given number(s) of months,
+    keeping the day but clipped to the end of the shifted month
+    (as pd.DateOffset does)
+    """
+    first_days = dates.astype('datetime64[M]')
+    shifted_months = first_days + np.asarray(months).astype('timedelta64[M]')
+    month_ends = (shifted_months + 1).astype('datetime64[D]') - 1
+    return np.minimum(
+        shifted_months.astype('datetime64[D]') + (dates - first_days), month_ends
+    )
+
 
 @functools.total_ordering
 class Label:
     """
     Creation of bucket label objects
     """
-    # constants needed for integrity checking
-    _single_label_pat = re.compile(r'(\d+)([YMWD])')
-    _letter_order_map = {'Y': 0, 'M': 1, 'W': 2, 'D': 3}
+    # no per-instance __dict__ (__weakref__ needed by the labels cache)
+    __slots__ = ('_label', '_periods', '_letter_map', '_dc_count',
+                 '__weakref__')
 
     def __new__(cls, *args, **kwargs):
         """
-        Implements idempotence. See links for more information:
+        Implements caching and idempotence. See links for more information:
+        https://stackoverflow.com/questions/16977196
         https://stackoverflow.com/questions/53481937
         https://www.concentricsky.com/articles/detail/pythons-hidden-new
         """
         # assert we get only the 'label' arg, as in __init__
-        if not kwargs and len(args) == 1 and isinstance(args[0], cls):
-            return args[0]
+        if not kwargs and len(args) == 1:
+            if isinstance(args[0], cls):
+                return args[0]
+            if isinstance(args[0], str):
+                cached = _label_cache.get(args[0])
+                if cached is not None and type(cached) is cls:
+                    return cached
         return super(Label, cls).__new__(cls)
 
     def __init__(self, label):
         # ------ integrity checks -------
         # idempotence: don't need to do __init__ all over again
-        if isinstance(label, Label):
+        # (also for instances returned from the cache)
+        if isinstance(label, Label) or hasattr(self, '_label'):
             return
 
         # type check
         if not isinstance(label, str):
             raise TypeError(f'Expected str, got {label.__class__.__name__}')
 
-        # uppercase check
-        if not label.isupper():
-            raise ValueError(f'Given label "{label}" must be uppercase')
-
-        # splitting label into vertices and consistency checks
-        match_list = self._single_label_pat.findall(label)
-        if not match_list:
-            raise ValueError(f'Invalid label format: {label}')
-
-        # assert all found single labels make the original label string given
-        rebuilt_label = ''.join([''.join(tup) for tup in match_list])
-        if rebuilt_label != label:
-            raise ValueError(f'Invalid label format: {label}')
-
-        # split label's letters and numbers
-        numbers = [int(tup[0]) for tup in match_list]
-        letters = [tup[1] for tup in match_list]
-
-        # FIXME: assert there are no labels with zero value
-        # for no in numbers:
-        #     if no == 0:
-        #         raise ValueError(f'Zero value in given label: {label}')
-
-        # assert there are no repeated letters
-        if max(label.count(char) for char in ''.join(letters)) not in (0, 1):
-            raise ValueError(f'Repeated letters in given label: {label}')
-
-        # assert letters are in order Y-M-W-D
-        if len(letters) > 1:
-            mapped_letters = [self._letter_order_map[c] for c in letters]
-            if sorted(mapped_letters) != mapped_letters:
-                raise ValueError(f'Label must be in Y-M-W-D order')
+        # splitting label into its number of periods, with consistency checks
+        ny, nm, nw, nd, dc_count = _parse_label(label)
 
         # -------- If we got to here, then it's all good,
         #          now can set the proper attributes --------------
 
-        # map of number of periods for each label
-        self._letter_map = {'Y': 0, 'M': 0, 'W': 0, 'D': 0}
-        for char, num in zip(letters, numbers):
-            self._letter_map[char] = num
+        # number of periods for each letter Y-M-W-D (its read-only map is
+        # built on first access: instances are shared through the cache,
+        # so they must be immutable)
+        self._periods = (ny, nm, nw, nd)
+        self._letter_map = None
 
         self._label = label
         # day count used only for comparison methods
-        self._dc_count = sum(n * self._letter_map.get(c, 0)
-                             for n, c in zip((1, 7, 30, 360), 'DWMY'))
+        self._dc_count = dc_count
+        # only valid labels get to the cache
+        _label_cache[label] = self
 
     @property
     def label(self):
@@ -101,6 +187,8 @@ class Label:
 
     @property
     def letter_map(self):
+        if self._letter_map is None:
+            self._letter_map = MappingProxyType(dict(zip('YMWD', self._periods)))
         return self._letter_map
 
     @property
@@ -126,7 +214,42 @@ class Label:
         return self.label
 
     def __hash__(self):
-        return hash(repr(self))
+        # consistent with __eq__: equal labels have the same day count
+        return hash(self._dc_count)
+
+    @classmethod
+    def parse_many(cls, labels):
+        """
+        Parses several label strings at once, without building
+        Label instances. Same integrity checks as the constructor.
+
+        Parameters
+        ----------
+        labels: list-like of str
+
+        Returns
+        -------
+        pd.DataFrame
+            Indexed by the labels, with the number of periods of each
+            letter in columns 'Y', 'M', 'W', 'D' and the day count
+            in column 'dc_count'
+        """
+        labels = pd.Series(labels, dtype=object)
+        if pd.api.types.infer_dtype(labels, skipna=False) not in {'string',
+                                                                  'empty'}:
+            raise TypeError('Expected only str labels')
+
+        periods = labels.str.extract(_FULL_LABEL_PATTERN, expand=True)
+        periods.columns = ['Y', 'M', 'W', 'D']
+        # no match (or empty label) leaves the whole row NaN
+        invalid = periods.isna().all(axis='columns')
+        if invalid.any():
+            raise ValueError(f'Invalid labels: {list(labels[invalid])}')
+
+        periods = periods.fillna('0').astype(np.int64)
+        periods.index = pd.Index(labels, name='Label')
+        periods['dc_count'] = periods.to_numpy() @ np.array([360, 30, 7, 1])
+        return periods
 
     def to_date(self, ref_date, *, date_adjust, cal=None):
         """
@@ -149,18 +272,14 @@ class Label:
         np.datetime64
             The shifted date
         """
-        if not isinstance(date_adjust, str):
-            raise TypeError(f'date_adjust parameter must be str, '
-                            f'got {date_adjust.__class__.__name__}')
-        date_adjust = date_adjust.upper()
-        if date_adjust not in {'DU', 'DC'}:
-            raise ValueError(f"date_adjust parameter must be "
-                             f"'DU' or 'DC', got '{date_adjust}'")
-
-        # it's easier to do date offsets with pandas Timestamp instance
-        ref_date = pd.Timestamp(ref_date)
-        # number of periods for each label D-W-M-Y
-        nd, nw, nm, ny = map(self.letter_map.get, 'DWMY')
+        date_adjust = _check_date_adjust(date_adjust)
+
+        # date offsets with np.datetime64 are much faster than pandas'
+        if not isinstance(ref_date, (pd.Timestamp, np.datetime64)):
+            ref_date = pd.Timestamp(ref_date)
+        ref_date = np.datetime64(ref_date, 'D')
+        # number of periods for each label Y-M-W-D
+        ny, nm, nw, nd = self._periods
 
         # The label about years is nothing more than the label of months x 12
         nm += 12 * ny
@@ -172,18 +291,69 @@ class Label:
         shifted = ref_date
         if nm > 0:
             # jump months
-            shifted += pd.DateOffset(months=nm)
+            shifted = _add_months(shifted, nm)
             if date_adjust == 'DU':
                 # Don't move to the next month if in EOM
-                shifted = pd.Timestamp(
-                    offsetdate(shifted, 0, roll='modifiedfollowing', cal=cal)
-                )
+                shifted = offsetdate(shifted, 0, roll='modifiedfollowing',
+                                     cal=cal)
         if nd > 0:
-            shifted += pd.DateOffset(days=nd)
+            shifted = shifted + np.timedelta64(nd, 'D')
             if date_adjust == 'DU':
                 shifted = offsetdate(shifted, 0, roll='forward', cal=cal)
 
-        return np.datetime64(shifted, 'D')
+        return shifted
+
+    @classmethod
+    def to_date_many(cls, labels, ref_date, *, date_adjust, cal=None):
+        """
+        Shifts the given reference date by each of the given labels,
+        all at once. Same as calling Label.to_date for each label.
+
+        Parameters
+        ----------
+        labels: list-like of str or Label
+        ref_date: date_like
+            The reference date
+        date_adjust: {'DU', 'DC'}
+            How to adjust the shifted dates. 'DC' means no adjust.
+            'DU' adjusts to a business day, according to the given
+            `cal` parameter
+        cal: str, optional
+            The calendar, used when `date_adjust` is 'DU', ignored otherwise
+
+        Returns
+        -------
+        np.ndarray
+            An array of shifted dates, in the labels' order
+        """
+        date_adjust = _check_date_adjust(date_adjust)
+
+        # same logic as Label.to_date, for all the labels at once
+        ref_date = np.datetime64(pd.Timestamp(ref_date), 'D')
+        periods = np.array(
+            [cls(label)._periods for label in labels], dtype=np.int64
+        ).reshape(-1, 4)
+        nm = 12 * periods[:, 0] + periods[:, 1]
+        nd = 7 * periods[:, 2] + periods[:, 3]
+
+        # jump months
+        shifted = _add_months(ref_date, nm)
+        if date_adjust == 'DU' and np.any(nm > 0):
+            # Don't move to the next month if in EOM
+            shifted = np.where(
+                nm > 0,
+                offsetdate(shifted, 0, roll='modifiedfollowing', cal=cal),
+                shifted
+            )
+
+        # jump days
+        shifted = shifted + nd.astype('timedelta64[D]')
+        if date_adjust == 'DU' and np.any(nd > 0):
+            shifted = np.where(
+                nd > 0, offsetdate(shifted, 0, roll='forward', cal=cal), shifted
+            )
+
+        return shifted
 
 
 # Label.to_date v1.1 function
@@ -268,13 +438,28 @@ class Bucket(pd.Series):
         Distributes the Bucket's values to another set of labels
     """
     def __init__(self, labels, values=None):
-        ix = pd.Index((Label(label) for label in labels), name='Bucket')
+        labels = [Label(label) for label in labels]
         # check there are no duplicated labels
-        if not ix.equals(ix.unique()):
+        if len(set(labels)) != len(labels):
             raise ValueError('Given labels must be all unique '
                              '(i.e. different dc_count)')
+
+        # sort labels (and values) by day count before building the series
+        order = np.argsort([label.dc_count for label in labels],
+                           kind='stable')
+        if values is not None and np.ndim(values) > 0:
+            if not isinstance(values, np.ndarray):
+                # keep the values' types, as pd.Series infers them
+                values = list(values)
+            if len(values) != len(labels):
+                raise ValueError(f'Length of values ({len(values)}) does not '
+                                 f'match length of labels ({len(labels)})')
+            if isinstance(values, np.ndarray):
+                values = values[order]
+            else:
+                values = [values[i] for i in order]
+        ix = pd.Index([labels[i] for i in order], dtype=object, name='Bucket')
         pd.Series.__init__(self, index=ix, data=values)
-        self.sort_index(inplace=True)
 
     def to_dates(self, ref_date, *, date_adjust, cal=None):
         """
@@ -296,10 +481,8 @@ class Bucket(pd.Series):
         np.ndarray
             An array of shifted dates
         """
-        return np.array(
-            [label.to_date(ref_date, date_adjust=date_adjust, cal=cal)
-             for label in self.index]
-        )
+        return Label.to_date_many(self.index, ref_date,
+                                  date_adjust=date_adjust, cal=cal)
 
     def distribute_values(self, verts, *, return_bucket=False):
         """
@@ -319,71 +502,49 @@ class Bucket(pd.Series):
             The bucket's values distributed as an array or as a new
             Bucket instance, according to the `return_bucket` parameter
         """
-        if np.any(np.isnan(self.values)):
+        # the bucket's values as a float array, extracted a single time
+        values = self.to_numpy(dtype=np.float64)
+        if np.any(np.isnan(values)):
             raise ValueError("Can't distribute NaN values")
 
         verts = [Label(label) for label in verts]
-        to_ndays = [v.dc_count for v in verts]
-
-        def find_closest(nd):
-            # return tuple -> closest label to the right and to the left
-            # from: [360, 1080, 2160],
-            # to: [720, 1440]
-            # find_closest(360) = (None, 720)
-            #
-            # from: [360, 1080],
-            # to: [360, 720]
-            # find_closest(360) = (360, 360)
-            # find_closest(1080) = (720, None)
-            try:
-                left = next(dropwhile(
-                    lambda to_nd: to_nd > nd, reversed(to_ndays)
-                ))
-            except StopIteration:
-                left = None
-            try:
-                right = next(dropwhile(
-                    lambda to_nd: to_nd < nd, to_ndays
-                ))
-            except StopIteration:
-                right = None
-
-            # left and right cannot be None at the same time
-            assert not (left is None and right is None), 'left = right = None!'
-            return left, right
-
-        # distribute values in the 'distributed' list
-        distributed = [0] * len(verts)
-        for label, value in self.iteritems():
-            nd_left, nd_right = find_closest(label.dc_count)
-            # calculate label's value proportions to the left and right
-            if nd_left is None:
-                # full value goes to the closest right label
-                distributed[to_ndays.index(nd_right)] += value
-            elif nd_right is None:
-                # full value goes to the closest left label
-                distributed[to_ndays.index(nd_left)] += value
-            elif nd_left == nd_right:
-                # same label, full value goes there
-                distributed[to_ndays.index(nd_left)] += value
-            else:
-                # allocate value proportionally to dc distance
-                perc_left = (nd_right - label.dc_count) / (nd_right - nd_left)
-                perc_right = (label.dc_count - nd_left) / (nd_right - nd_left)
-                # sanity checks
-                assert 0 < perc_left < 1
-                assert 0 < perc_right < 1
-                assert round(perc_left + perc_right, 7) == 1
-                distributed[to_ndays.index(nd_left)] += perc_left * value
-                distributed[to_ndays.index(nd_right)] += perc_right * value
+        if not verts:
+            raise ValueError('No labels given to distribute the values to')
+        # sorted (unique) day counts of the new labels, and their positions
+        # in verts. The bucket's labels are already sorted by day count
+        to_ndays, to_pos = np.unique(
+            np.fromiter((v.dc_count for v in verts), np.int64, len(verts)),
+            return_index=True
+        )
+        from_ndays = np.fromiter((label.dc_count for label in self.index),
+                                 np.int64, len(self.index))
+
+        # closest new label to the left and to the right of each label:
+        # from: [360, 1080, 2160],
+        # to: [720, 1440]
+        # left = [720, 720, 1440], right = [720, 1440, 1440]
+        # (the same label if it's an exact match or outside the new labels)
+        right = np.searchsorted(to_ndays, from_ndays, side='left')
+        left = np.searchsorted(to_ndays, from_ndays, side='right') - 1
+        left = np.where(left < 0, right, left)
+        right = np.where(right == len(to_ndays), left, right)
+
+        # allocate value proportionally to dc distance (full value
+        # goes to the left label when it's the same as the right one)
+        dist = to_ndays[right] - to_ndays[left]
+        perc_right = np.divide(from_ndays - to_ndays[left], dist,
+                               out=np.zeros(len(dist)), where=dist != 0)
+        distributed = np.zeros(len(verts))
+        np.add.at(distributed, to_pos[left], (1 - perc_right) * values)
+        np.add.at(distributed, to_pos[right], perc_right * values)
 
         # sanity check on the sum of values:
-        assert np.isclose(np.sum(distributed), np.sum(self.values), rtol=0, atol=1e-2)
+        assert np.isclose(np.sum(distributed), np.sum(values), rtol=0, atol=1e-2)
 
         if return_bucket:
             return Bucket(verts, distributed)
         else:
-            return np.array(distributed)
+            return distributed
 
 
 def labeltodate(date, label, *, date_adjust, cal=None):
@@ -407,7 +568,19 @@ def labeltodate(date, label, *, date_adjust, cal=None):
     -------
     np.datetime64
         The shifted date
+
+    Notes
+    -----
+    Results are memoized (per process) by date, label, date_adjust and cal
     """
+    date = np.datetime64(pd.Timestamp(date), 'D')
+    if isinstance(label, Label):
+        label = label.label
+    return _labeltodate_cached(date, label, _check_date_adjust(date_adjust), cal)
+
+
+@functools.lru_cache(maxsize=4096)
+def _labeltodate_cached(date, label, date_adjust, cal):
     return Label(label).to_date(date, date_adjust=date_adjust, cal=cal)
 
 
@@ -3,9 +3,8 @@ Essential functions for dealing with business days dates
 """
 
 # Python
-import datetime as dt
 import pkgutil
-import collections
+import functools
 from typing import Iterable
 from xml.etree import ElementTree
 
@@ -25,35 +24,34 @@ _CALENDARS = dict()
 # ------------------ private methods --------------------
 
 
-def _xldate_to_datetime(xldate):
+def _xldates_to_datetime64(xldates):
     """
-    Transforms an integer date represented by MS Excel to python's datetime.
-    Function mostly copied from xlrd's function "xldate_as_datetime" so
+    Transforms integer dates represented by MS Excel to np.datetime64[D].
+    Vectorized version of xlrd's function "xldate_as_datetime", so
     we don't need to depend on this external library. Used by default with
     the 'datemode' parameter set to 0.
 
     Parameters
     ----------
-    xldate: int
-        The Excel date number
+    xldates: array_like of int
+        The Excel date numbers
 
     Returns
     -------
-    dt.date
-        Python's date representation
+    np.ndarray of np.datetime64[D]
+        The dates in numpy's representation
     """
     # The integer part of the Excel date stores
     # the number of days since the epoch
-    days = int(xldate)
+    days = np.asarray(xldates, dtype=np.int64)
 
-    # Set the epoch
-    if days < 60:
-        epoch = dt.datetime(1899, 12, 31)  # epoch_1900
-    else:
-        # Workaround Excel 1900 leap year bug by adjusting the epoch.
-        epoch = dt.datetime(1899, 12, 30)  # epoch_1900_minus_1
+    # Set the epoch: epoch_1900 for the first 59 days, else workaround
+    # Excel 1900 leap year bug by adjusting the epoch (epoch_1900_minus_1)
+    epochs = np.where(days < 60,
+                      np.datetime64('1899-12-31', 'D'),
+                      np.datetime64('1899-12-30', 'D'))
 
-    return (epoch + dt.timedelta(days)).date()
+    return epochs + days.astype('timedelta64[D]')
 
 
 def _load_calendar(cal):
@@ -81,8 +79,9 @@ def _load_calendar(cal):
         raise ValueError(f'Invalid/NotImplemented calendar: {cal}')
 
     root = ElementTree.fromstring(data)
-    holidays = np.array([_xldate_to_datetime(int(child.text))
-                         for child in root], dtype='datetime64[D]')
+    holidays = _xldates_to_datetime64(
+        np.fromiter((int(child.text) for child in root), dtype=np.int64)
+    )
     _CALENDARS[cal] = np.busdaycalendar(holidays=holidays)
 
 
@@ -105,7 +104,13 @@ def _get_bdaycalendar(cal):
     if not isinstance(cal, str):
         raise TypeError(f'Calendar input must be str, '
                         f'got {cal.__class__.__name__}')
-    cals = cal.upper().split()
+    # same calendars given in another order or case share the cache entry
+    return _get_bdaycalendar_cached(' '.join(sorted(cal.upper().split())))
+
+
+@functools.lru_cache(maxsize=64)
+def _get_bdaycalendar_cached(cal):
+    cals = cal.split()
     # load given calendar(s), if not already loaded:
     for cal in cals:
         _load_calendar(cal)
@@ -114,10 +119,11 @@ def _get_bdaycalendar(cal):
         return _CALENDARS[cals[0]]
     elif len(cals) > 1:
         # cross calendar required: join the required calendars' holidays
-        # and return a new np.busdaycalendar with the merged holidays
-        cross_cal = np.busdaycalendar(
-            holidays=np.concatenate([_CALENDARS[cal].holidays for cal in cals])
-        )
+        # (sorted, without the common ones) and return a new
+        # np.busdaycalendar with the merged holidays
+        cross_cal = np.busdaycalendar(holidays=np.unique(
+            np.concatenate([_CALENDARS[cal].holidays for cal in cals])
+        ))
         return cross_cal
     else:
         # we should never get here, but who knows...
@@ -143,13 +149,38 @@ def _normalize_dates(dates):
         The same input but with dates transformed to np.datetime64[D] dtype.
 
     """
-    # transform given dates to the very flexible
-    # pandas.Timestamp, and then to np.datetime64
     if isinstance(dates, Iterable) and not isinstance(dates, str):
-        return np.array([np.datetime64(pd.Timestamp(v), 'D') for v in dates])
+        return _normalize_array(dates)
     else:
         # single input case
-        return np.datetime64(pd.Timestamp(dates), 'D')
+        try:
+            return _normalize_scalar(dates)
+        except TypeError:
+            # unhashable input, can't be cached
+            return _normalize_scalar.__wrapped__(dates)
+
+
+@functools.lru_cache(maxsize=4096)
+def _normalize_scalar(date):
+    # transform given date to the very flexible
+    # pandas.Timestamp, and then to np.datetime64
+    return np.datetime64(pd.Timestamp(date), 'D')
+
+
+def _normalize_array(dates):
+    # naive datetime64 arrays (np.ndarray, DatetimeIndex, Series)
+    # need only a cast
+    if pd.api.types.is_datetime64_dtype(dates):
+        return np.asarray(dates).astype('datetime64[D]')
+    # a single (vectorized) parse with pandas, caching repeated values
+    dates = list(dates)
+    try:
+        parsed = pd.to_datetime(dates, cache=True)
+    except (ValueError, TypeError):
+        # e.g. strings in different formats: transform each given date to
+        # the very flexible pandas.Timestamp, and then to np.datetime64
+        return np.array([np.datetime64(pd.Timestamp(v), 'D') for v in dates])
+    return np.asarray(parsed.values).astype('datetime64[D]')
 
 
 def _calc_term(start_dates, end_dates, *, day_count, cal=None):
@@ -169,39 +200,16 @@ def _calc_term(start_dates, end_dates, *, day_count, cal=None):
     start_dates = _normalize_dates(start_dates)
     end_dates = _normalize_dates(end_dates)
 
-    def act_act_term(start, end):
+    def year_fraction(dates):
         """
-        Calculation of ACT/ACT term: equals
-            (days_not_in_leap_year / 365) + (days_in_leap_year / 366)
-        Parameters (start, end) should be scalars.
+        Splits np.datetime64[D] dates into their year (as int) and the
+        fraction of that year elapsed until the date (ACT/ACT basis)
         """
-        start, end = map(pd.Timestamp, (start, end))
-        sign = 1
-        # in case the start date is greater than the end date,
-        # we swap the dates, do the calculations normally, and
-        # just multiply the result term by -1.
-        if start > end:
-            sign = -1
-            start, end = end, start
-
-        term = 0
-        for year in range(start.year, end.year + 1):
-            den = 366 if pd.Timestamp(str(year)).is_leap_year else 365
-
-            if year == start.year == end.year:
-                num = (end - start).days
-            elif year == start.year:
-                num = (pd.Timestamp(str(year + 1)) - start).days
-            elif year == end.year:
-                num = (end - pd.Timestamp(str(year))).days
-            else:
-                # start.year < year < end.year
-                num = (pd.Timestamp(str(year + 1))
-                       - pd.Timestamp(str(year))).days
-
-            term += num / den
-
-        return term * sign
+        years = dates.astype('datetime64[Y]')
+        year_starts = years.astype('datetime64[D]')
+        # 365 or 366 days, for leap years
+        year_lengths = (years + 1).astype('datetime64[D]') - year_starts
+        return years.astype(int), (dates - year_starts) / year_lengths
 
     if day_count == 'ACT/ACT':
         return_scalar = False  # flag to return a scalar or np.array
@@ -216,15 +224,22 @@ def _calc_term(start_dates, end_dates, *, day_count, cal=None):
             end_dates = np.array([end_dates])
             return_scalar = True
 
-        result = np.array([act_act_term(s, e) for (s, e)
-                           in zip(start_dates, end_dates)])
+        # ACT/ACT term equals
+        #     (days_not_in_leap_year / 365) + (days_in_leap_year / 366)
+        # which sums up to the whole years between the dates' years plus
+        # the difference of the elapsed fractions of those years. Also
+        # gives the negative term if the start date is after the end date
+        start_years, start_fractions = year_fraction(start_dates)
+        end_years, end_fractions = year_fraction(end_dates)
+        result = (end_years - start_years) + (end_fractions - start_fractions)
 
         if return_scalar:
             return result[0]
         else:
             return result
 
-    actual_count = (end_dates - start_dates).astype(int)
+    # timedelta64[D] reinterpreted as the int number of days, without a copy
+    actual_count = (end_dates - start_dates).view(np.int64)
     if day_count == 'ACT/365':
         return actual_count / 365
     if day_count == 'ACT/360':
@@ -359,7 +374,7 @@ def bday_range(start=None, end=None, periods=None, cal='BRL'):
     -----
     Of the three parameters (start, end, periods), exactly two must be specified
     """
-    if collections.Counter((start, end, periods)).get(None) != 1:
+    if (start is None) + (end is None) + (periods is None) != 1:
         raise ValueError("Of the three parameters (start, end, periods), "
                          "exactly two must be specified")
     return pd.bdate_range(start, end, periods, freq='C',
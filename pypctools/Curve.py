@@ -2,9 +2,6 @@
 Main functions for dealing with curves and interpolation
 """
 
-# Python
-from typing import Iterable
-
 # External
 import numpy as np
 
@@ -16,6 +13,49 @@ from pypctools.Txts import load_pricing_vertices
 __all__ = ['rate2fct', 'fct2rate', 'Curve']
 
 
+# rates <-> factors conversion kernels for each compounding method,
+# given the term already calculated
+_RATE2FCT_KERNELS = {
+    'YIELD': lambda rates, term: (1 + rates) ** term,
+    'LINEAR': lambda rates, term: 1 + rates * term,
+    'CONTINUOUS': lambda rates, term: np.exp(rates * term),
+}
+
+_FCT2RATE_KERNELS = {
+    'YIELD': lambda factors, term: factors ** (1 / term) - 1,
+    'LINEAR': lambda factors, term: (factors - 1) / term,
+    'CONTINUOUS': lambda factors, term: np.log(factors) / term,
+}
+
+
+def _get_kernel(kernels, compounding):
+    """Returns the conversion kernel for the given compounding"""
+    try:
+        return kernels[compounding.upper()]
+    except KeyError:
+        raise ValueError(f'Invalid compounding parameter: {compounding}')
+
+
+def _rate2fct_from_term(rates, term, compounding):
+    """
+    Convert rates to factors, with the term already calculated.
+    Skips the dates normalization and term calculation of rate2fct
+    """
+    return _get_kernel(_RATE2FCT_KERNELS, compounding)(rates, term)
+
+
+def _fct2rate_from_term(factors, term, compounding):
+    """
+    Convert factors to rates, with the term already calculated.
+    Skips the dates normalization and term calculation of fct2rate
+    """
+    kernel = _get_kernel(_FCT2RATE_KERNELS, compounding)
+    with np.errstate(divide='ignore'):  # where term == 0, sets rate = 0
+        out = kernel(factors, term)
+
+    return np.nan_to_num(out)
+
+
 def rate2fct(rates, start_dates, end_dates, *,
              compounding, day_count, cal=None):
     """
@@ -39,22 +79,13 @@ def rate2fct(rates, start_dates, end_dates, *,
     -------
     float or array of float
     """
-    if isinstance(rates, Iterable):
-        rates = np.fromiter(rates, float)
+    rates = np.asarray(rates, dtype=np.float64)
     term = _calc_term(start_dates, end_dates, day_count=day_count, cal=cal)
     if np.any(term < 0):
         raise ValueError("Unable to calculate factors "
                          "with end_dates < start_dates")
 
-    compounding = compounding.upper()
-    if compounding == 'YIELD':
-        return (1 + rates) ** term
-    elif compounding == 'LINEAR':
-        return 1 + rates * term
-    elif compounding == 'CONTINUOUS':
-        return np.exp(rates * term)
-    else:
-        raise ValueError(f'Invalid compounding parameter: {compounding}')
+    return _rate2fct_from_term(rates, term, compounding)
 
 
 def fct2rate(factors, start_dates, end_dates, *,
@@ -80,25 +111,13 @@ def fct2rate(factors, start_dates, end_dates, *,
     -------
     float or array of float
     """
-    if isinstance(factors, Iterable):
-        factors = np.fromiter(factors, float)
+    factors = np.asarray(factors, dtype=np.float64)
     term = _calc_term(start_dates, end_dates, day_count=day_count, cal=cal)
     if np.any(term < 0):
         raise ValueError("Unable to calculate factors "
                          "with end_dates < start_dates")
 
-    compounding = compounding.upper()
-    with np.errstate(divide='ignore'):  # where term == 0, sets rate = 0
-        if compounding == 'YIELD':
-            out = factors ** (1 / term) - 1
-        elif compounding == 'LINEAR':
-            out = (factors - 1) / term
-        elif compounding == 'CONTINUOUS':
-            out = np.log(factors) / term
-        else:
-            raise ValueError(f'Invalid compounding parameter: {compounding}')
-
-    return np.nan_to_num(out)
+    return _fct2rate_from_term(factors, term, compounding)
 
 
 class Curve:
@@ -108,9 +127,9 @@ class Curve:
         end_dates = _normalize_dates(end_dates)
 
         # ------- consistency checks -----------------
-        if not isinstance(rates, Iterable):
+        rates = np.asarray(rates, dtype=np.float64)
+        if rates.ndim == 0:
             raise TypeError("'rates' parameter must be array_like")
-        rates = np.fromiter(rates, float)
 
         # length-consistency checks on dates and rates
         if isinstance(end_dates, np.ndarray):
@@ -126,19 +145,22 @@ class Curve:
         else:
             raise ValueError('end_dates must be array_like')
 
-        # other checks on end_dates
-        if not np.array_equal(np.sort(end_dates), end_dates):
+        # other checks on end_dates, comparing consecutive dates
+        # in a single pass instead of sorting them:
+        end_dates_diff = np.diff(end_dates).astype(int)
+        if np.any(end_dates_diff < 0):
             raise ValueError('end_dates must be sorted in ascending order')
-        if not len(np.unique(end_dates)) == len(end_dates):
+        if np.any(end_dates_diff == 0):
             raise ValueError('end_dates must be all unique')
 
         # curve reference date, implied by 'start_dates':
         ref_date = start_dates[0]
 
-        # busday count consistency check:
+        # busday count consistency check (end_dates are sorted,
+        # so repeated counts can only be consecutive):
         if day_count.upper() == 'BUS/252':
             nbusdays = bdbetween(ref_date, end_dates, cal=cal)
-            if len(np.unique(nbusdays)) != len(nbusdays):
+            if np.any(np.diff(nbusdays) == 0):
                 raise ValueError('Dates given must have no repeated '
                                  'business days count')
 
@@ -146,27 +168,28 @@ class Curve:
             raise ValueError(f"interp_method parameter must be 'LIN' or 'EXP'")
 
         # --- determination of ZC factors for the curve ---
-        factors = []
-        for i in range(len(end_dates)):
-            temp_fct = rate2fct(rates[i], start_dates[i], end_dates[i],
-                                compounding=compounding, day_count=day_count,
-                                cal=cal)
-            if start_dates[i] == ref_date:
-                # already a ZC factor, nothing to do
-                pass
-            else:
-                # find the FRA from previous factors:
-                found_fra = False
-                for j in range(i):
-                    if end_dates[j] == start_dates[i]:
-                        # now we can determine the ZC factor:
-                        found_fra = True
-                        temp_fct *= factors[j]
-                if not found_fra:
-                    raise ValueError("Cannot calculate FRA's with given dates")
-
-            factors.append(temp_fct)
-        factors = np.array(factors)
+        # factors from each start date to its end date, all in one pass:
+        factors = rate2fct(rates, start_dates, end_dates,
+                           compounding=compounding, day_count=day_count,
+                           cal=cal)
+
+        # FRA's: each start date not in ref_date must be the end date of a
+        # previous vertex (its "parent"). ZC vertices get parent = -1
+        is_fra = start_dates != ref_date
+        parents = np.searchsorted(end_dates, start_dates)
+        found_fra = (parents < np.arange(len(end_dates))) \
+            & (end_dates[np.minimum(parents, len(end_dates) - 1)] == start_dates)
+        if np.any(is_fra & ~found_fra):
+            raise ValueError("Cannot calculate FRA's with given dates")
+        parents = np.where(is_fra, parents, -1)
+
+        # chain the FRA's into ZC factors by pointer jumping: at each step
+        # multiply by the parent's (partial) factor and jump to its parent,
+        # so a chain of n FRA's is resolved in log2(n) vectorized steps
+        while np.any(parents >= 0):
+            has_parent = parents >= 0
+            factors = np.where(has_parent, factors * factors[parents], factors)
+            parents = np.where(has_parent, parents[parents], -1)
 
         # ---- done with checks, now we can set the curve's attributes ----
         self.ref_date = ref_date
@@ -176,38 +199,41 @@ class Curve:
         self.compounding = compounding.upper()
         self.day_count = day_count.upper()
         self.factors = factors
-        self.rates = fct2rate(factors, ref_date, end_dates,
-                              compounding=compounding, day_count=day_count,
-                              cal=cal)
-        if interp_method.upper() == 'EXP':
-            self.log_factors = np.log(factors)  # for exponential interpolation
-        else:
-            self.log_factors = None
-        # ndays: the x axis for interpolation:
+        # for exponential interpolation, kept regardless of interp_method
+        self.log_factors = np.ascontiguousarray(np.log(factors),
+                                                dtype=np.float64)
+        # ndays: the x axis for interpolation. Stored as float64,
+        # so np.interp doesn't need to cast it on every call
         if day_count.upper() == 'BUS/252':
             self.cal = cal.upper()
-            self.ndays = bdbetween(ref_date, end_dates, cal=cal)
+            ndays = nbusdays  # already calculated in the checks
         else:
             self.cal = None
-            self.ndays = (end_dates - ref_date).astype(int)
+            ndays = (end_dates - ref_date).astype(int)
+        self.ndays = ndays.astype(np.float64)
+        self.rates = self.__zc_f2r(factors, self._term_from_ndays(ndays))
 
-    def __zc_r2f(self, rates, dates):
+    def __zc_r2f(self, rates, term):
         """
         Wrapper around rate2fct, customized for this Curve instance.
-        Calculates factors from Curve's ref_date to given dates.
+        Calculates factors from Curve's ref_date, given the term already
+        calculated from the ndays, so the days count is not done again.
         """
-        return rate2fct(rates, self.ref_date, dates,
-                        compounding=self.compounding, day_count=self.day_count,
-                        cal=self.cal)
+        if np.any(term < 0):
+            raise ValueError("Unable to calculate factors "
+                             "with end_dates < start_dates")
+        return _rate2fct_from_term(rates, term, self.compounding)
 
-    def __zc_f2r(self, factors, dates):
+    def __zc_f2r(self, factors, term):
         """
         Wrapper around fct2rate, customized for this Curve instance.
-        Calculates rates from Curve's ref_date to given dates.
+        Calculates rates from Curve's ref_date, given the term already
+        calculated from the ndays, so the days count is not done again.
         """
-        return fct2rate(factors, self.ref_date, dates,
-                        compounding=self.compounding, day_count=self.day_count,
-                        cal=self.cal)
+        if np.any(term < 0):
+            raise ValueError("Unable to calculate factors "
+                             "with end_dates < start_dates")
+        return _fct2rate_from_term(factors, term, self.compounding)
 
     def interp(self, dates):
         """
@@ -225,30 +251,76 @@ class Curve:
             Interpolated rates
         """
         dates = _normalize_dates(dates)
+        return self._interp_from_ndays(self._calc_ndays(dates))
+
+    def interp_ndays(self, ndays):
+        """
+        Interpolate the curve in the given number of days from the curve's
+        reference date, i.e. the curve's x axis: business days when
+        `day_count` is 'BUS/252', actual days otherwise.
+
+        Useful when interpolating many curves with the same reference date
+        on the same dates, so the days count is calculated only once.
+
+        Parameters
+        ----------
+        ndays: number or array of numbers
+            Number of days from the curve's reference date. Fractional
+            days are interpolated as given
+
+        Returns
+        -------
+        float or array of float
+            Interpolated rates
+        """
+        return self._interp_from_ndays(np.asarray(ndays, dtype=np.float64))[()]
 
-        # calculate the ndays from curve's ref_date
+    def _calc_ndays(self, dates):
+        """
+        Calculates the ndays (the x axis for interpolation) from Curve's
+        ref_date to the given dates. Dates must be already normalized.
+        """
         if self.day_count == 'BUS/252':
-            x = bdbetween(self.ref_date, dates, cal=self.cal)
+            return bdbetween(self.ref_date, dates, cal=self.cal)
         else:
-            x = (dates - self.ref_date).astype(int)
+            return (dates - self.ref_date).astype(int)
 
+    def _term_from_ndays(self, x):
+        """
+        Calculates the term from Curve's ref_date, given the ndays `x`,
+        without the need of the dates themselves (except for ACT/ACT)
+        """
+        if self.day_count == 'ACT/ACT':
+            days = np.asarray(x, dtype=int).astype('timedelta64[D]')
+            dates = self.ref_date + days
+            return _calc_term(self.ref_date, dates[()], day_count='ACT/ACT')
+        return x / {'BUS/252': 252, 'ACT/360': 360, 'ACT/365': 365}[self.day_count]
+
+    def _interp_from_ndays(self, x):
+        """
+        Interpolation core, given the ndays `x` from Curve's ref_date
+        """
+        # float64 x, same dtype as the Curve's ndays, so np.interp
+        # runs without casting
+        x = np.asarray(x, dtype=np.float64)
         if self.interp_method == 'EXP':
-            # little hack: when the given date is outside the Curve's
-            # date range, force it temporarily to one of the boundaries,
+            # little hack: when the given ndays is outside the Curve's
+            # range, force it temporarily to one of the boundaries,
             # so exponential interpolation will return flat rates
-            # automatically by np.interp and fct2rate
-            if isinstance(dates, np.ndarray):
-                dates = np.where(dates < self.end_dates[0],
-                                 self.end_dates[0], dates)
-                dates = np.where(dates > self.end_dates[-1],
-                                 self.end_dates[-1], dates)
-            else:
-                dates = max(min(dates, self.end_dates[-1]), self.end_dates[0])
+            # automatically by np.interp and the factor to rate conversion
+            x = np.clip(x, self.ndays[0], self.ndays[-1])
 
             # linear interpolation on the log of Curve's factors:
-            interp_factors = np.exp(np.interp(x, self.ndays, self.log_factors))
+            interp_log_factors = np.interp(x, self.ndays, self.log_factors)
+            term = self._term_from_ndays(x)
             # return rates:
-            return self.__zc_f2r(interp_factors, dates)
+            if self.compounding == 'YIELD':
+                # factors ** (1 / term) - 1 == expm1(log_factors / term),
+                # so we skip the exp -> power round trip on the factors.
+                # Where term == 0, sets rate = 0 (as in fct2rate)
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    return np.nan_to_num(np.expm1(interp_log_factors / term))
+            return self.__zc_f2r(np.exp(interp_log_factors), term)
         elif self.interp_method == 'LIN':
             # linear interpolation on rates
             return np.interp(x, self.ndays, self.rates)
@@ -267,11 +339,29 @@ class Curve:
         float or array of float
             Interpolated rates
         """
-        start_factors = self.__zc_r2f(self.interp(start_dates), start_dates)
-        end_factors = self.__zc_r2f(self.interp(end_dates), end_dates)
-        return fct2rate(end_factors / start_factors, start_dates, end_dates,
-                        compounding=self.compounding, day_count=self.day_count,
-                        cal=self.cal)
+        start_dates, end_dates = np.broadcast_arrays(
+            _normalize_dates(start_dates), _normalize_dates(end_dates)
+        )
+        shape = start_dates.shape
+        start_dates, end_dates = start_dates.ravel(), end_dates.ravel()
+
+        # interpolate start and end dates together, so the ndays calculation,
+        # the interpolation and the factors conversion are done only once
+        x = self._calc_ndays(np.concatenate([start_dates, end_dates]))
+        all_terms = self._term_from_ndays(x)
+        all_factors = self.__zc_r2f(self._interp_from_ndays(x), all_terms)
+        start_factors, end_factors = np.split(all_factors, 2)
+        # terms are additive, so the FRA's term comes straight
+        # from the ZC terms, without counting days again:
+        start_terms, end_terms = np.split(all_terms, 2)
+        fra_terms = end_terms - start_terms
+        if np.any(fra_terms < 0):
+            raise ValueError("Unable to calculate factors "
+                             "with end_dates < start_dates")
+        rates = _fct2rate_from_term(end_factors / start_factors, fra_terms,
+                                    self.compounding)
+        # return a scalar if both start and end dates were scalars
+        return rates.reshape(shape)[()]
 
     def __repr__(self):
         return f'Curve: ref_date = {self.ref_date}, ' \
@@ -4,8 +4,12 @@ Functions for loading published pricing txt files from the network
 
 # Python
 from os import path, scandir
+from collections import defaultdict
+import re
+import time
 import functools
 import fnmatch
+from importlib.util import find_spec
 
 # External
 import pandas as pd
@@ -13,11 +17,14 @@ import pandas as pd
 
 __all__ = ['load_pricing_vertices', 'load_pricing_curve',
            'load_pricing_bond', 'read_currency', 'read_index',
-           'load_pricing_tvm']
+           'read_index_many', 'load_pricing_tvm']
 
 
 _ROOT_DIR = r'\\bsbrsp55\Hist_AC\Pricing_Publication'
 
+# faster (multithreaded) csv parsing for the fixed layout txts, if available
+_CSV_ENGINE = 'pyarrow' if find_spec('pyarrow') else 'c'
+
 _SUBFOLDER_MAP = {
     'curves': (r'Curves\ONSHORE',
                r'Curves\OFFSHORE'),
@@ -33,18 +40,54 @@ _SUBFOLDER_MAP = {
     'equities': (r'Equities',),
 }
 
+# listings of the folders where files were found, in the form
+# {folder: (listing time, file names)}, reused for _LISTING_TTL seconds
+_LISTINGS = dict()
+_LISTING_TTL = 300
+
+
+@functools.lru_cache(maxsize=512)
+def _ref_date_str(ref_date) -> str:
+    """Transforms the date_like ref_date -> 'YYYYMMDD', as in the txt names"""
+    return pd.Timestamp(ref_date).strftime("%Y%m%d")
+
 
 def _easy_txt_rootname(root_fname: str) -> str:
     """Transforms 'ON BRL IPCA' -> 'ON_BRL_IPCA'"""
     return '_'.join(root_fname.strip().upper().split())
 
 
+def _isfile(filepath: str) -> bool:
+    """
+    path.isfile, avoiding the (network) syscall for files in a recent
+    listing of their folder. Files not listed are checked on disk, since
+    they may have been published after the listing. A folder is only
+    listed once a file is found in it, so misses cost a single path.isfile
+    """
+    folder, filename = path.split(filepath)
+    now = time.monotonic()
+    listed_at, names = _LISTINGS.get(folder, (None, frozenset()))
+    fresh = listed_at is not None and now - listed_at < _LISTING_TTL
+    if fresh and filename in names:
+        return True
+    if not path.isfile(filepath):
+        return False
+    if not fresh:
+        try:
+            with scandir(folder) as entries:
+                _LISTINGS[folder] = (now, frozenset(f.name for f in entries
+                                                    if f.is_file()))
+        except OSError:
+            pass
+    return True
+
+
 def _find_file(subfolders: tuple, filename: str):
     """Returns the filepath of the filename"""
     # search folders:
     for folder in subfolders:
         filepath = path.join(_ROOT_DIR, folder, filename)
-        if path.isfile(filepath):
+        if _isfile(filepath):
             return filepath
 
     # old files:
@@ -52,7 +95,7 @@ def _find_file(subfolders: tuple, filename: str):
     yyyymm = curve_date[:6]
     for folder in subfolders:
         filepath = path.join(_ROOT_DIR, folder, yyyymm, filename)
-        if path.isfile(filepath):
+        if _isfile(filepath):
             return filepath
 
     raise FileNotFoundError(f"Couldn't find {filename}.")
@@ -63,13 +106,16 @@ def _list_available_files(subfolders, date):
     Searches the subfolders and returns a list of available
     files with the given date.
     """
-    file_pat = f"*_{pd.Timestamp(date).strftime('%Y%m%d')}.txt"
+    file_pat = f"*_{_ref_date_str(date)}.txt"
+    # pattern translated a single time (normcase: same matching as fnmatch)
+    file_re = re.compile(fnmatch.translate(path.normcase(file_pat)))
 
     files = []
     for subfolder in subfolders:
         folder = path.join(_ROOT_DIR, subfolder)
-        files += [f.name.rsplit('_', 1)[0]
-                  for f in fnmatch.filter(scandir(folder), file_pat)]
+        with scandir(folder) as entries:
+            files += [f.name.rsplit('_', 1)[0] for f in entries
+                      if file_re.match(path.normcase(f.name))]
 
     return files
 
@@ -91,18 +137,23 @@ def load_pricing_vertices(curve_name, ref_date):
 
     """
     curve_name = _easy_txt_rootname(curve_name)
-    ref_date_str = pd.Timestamp(ref_date).strftime("%Y%m%d")
+    ref_date_str = _ref_date_str(ref_date)
 
     filename = f'{curve_name}_{ref_date_str}.txt'
     filepath = _find_file(_SUBFOLDER_MAP['vertices'], filename)
 
-    return pd.read_csv(
+    df = pd.read_csv(
         filepath,
         delimiter=';',
         dtype={'RATE': float},
-        parse_dates=['START_DATE', 'END_DATE'],
-        date_parser=lambda d: pd.to_datetime(d, format='%d/%m/%Y'),
+        engine=_CSV_ENGINE,
     )
+    # parse dates after reading (the pyarrow engine
+    # doesn't support all of read_csv's date options)
+    for col in ('START_DATE', 'END_DATE'):
+        df[col] = pd.to_datetime(df[col], format='%d/%m/%Y', cache=True)
+
+    return df
 
 
 def load_pricing_curve(curve_name, ref_date):
@@ -122,19 +173,22 @@ def load_pricing_curve(curve_name, ref_date):
         A dataframe indexed by 'DATE'
     """
     curve_name = _easy_txt_rootname(curve_name)
-    ref_date_str = pd.Timestamp(ref_date).strftime("%Y%m%d")
+    ref_date_str = _ref_date_str(ref_date)
 
     filename = f'{curve_name}_{ref_date_str}.txt'
     filepath = _find_file(_SUBFOLDER_MAP['curves'], filename)
 
-    return pd.read_csv(
+    df = pd.read_csv(
         filepath,
         sep=';',
         dtype={'DISC_FACTOR': float, 'ACCUM_FACTOR': float, 'RATE': float},
-        parse_dates=['DATE'],
-        date_parser=lambda d: pd.to_datetime(d, format='%d/%m/%Y'),
-        index_col='DATE',
+        engine=_CSV_ENGINE,
     )
+    # parse dates after reading (the pyarrow engine
+    # doesn't support all of read_csv's date options)
+    df['DATE'] = pd.to_datetime(df['DATE'], format='%d/%m/%Y', cache=True)
+
+    return df.set_index('DATE')
 
 
 def load_pricing_bond(bond_file, ref_date):
@@ -153,7 +207,7 @@ def load_pricing_bond(bond_file, ref_date):
     pd.Dataframe
     """
     bond_file = _easy_txt_rootname(bond_file)
-    ref_date_str = pd.Timestamp(ref_date).strftime("%Y%m%d")
+    ref_date_str = _ref_date_str(ref_date)
 
     filename = f'{bond_file}_{ref_date_str}.txt'
     filepath = _find_file(_SUBFOLDER_MAP['bonds'], filename)
@@ -163,7 +217,8 @@ def load_pricing_bond(bond_file, ref_date):
 
     # parse dates (if needed):
     if 'MATURITY' in df.columns:
-        df['MATURITY'] = pd.to_datetime(df['MATURITY'], format='%d/%m/%Y')
+        df['MATURITY'] = pd.to_datetime(df['MATURITY'], format='%d/%m/%Y',
+                                        cache=True)
 
     return df
 
@@ -189,7 +244,7 @@ def read_currency(cur_pair, ref_date, which='SPOT'):
     float
     """
     cur_pair = cur_pair.upper()
-    ref_date_str = pd.Timestamp(ref_date).strftime("%Y%m%d")
+    ref_date_str = _ref_date_str(ref_date)
     which = which.upper()
 
     filename = f'FX_{which}_{ref_date_str}.txt'
@@ -201,6 +256,30 @@ def read_currency(cur_pair, ref_date, which='SPOT'):
     return float(df.at[cur_pair])
 
 
+# read_index's dispatch, in the form:
+# {index name: (file prefix, subfolder key, index column, row, column)}
+# where column is None for the single column files
+_INDEX_DISPATCH = {
+    # Index
+    **{name: ('INDEX_ON', 'index', 'NAME', name, None)
+       for name in ('IDI1', 'IDI2', 'ISE', 'ITJLP', 'TR')},
+    # Inflation
+    **{f'{name}{suffix}': ('ON_INFLATION', 'rates', 'INDEX_NAME', name, col)
+       for name in ('IGPM', 'IPCA', 'INCCM')
+       for suffix, col in (('', 'LAST_VALUE'),
+                           ('_PRORATA', 'PRORATED_INDEX'),
+                           ('_RATE', 'VARIATION_FORECAST'))},
+    # Overnight
+    **{name: ('ON_OVERNIGHT', 'rates', 'NAME', name, None)
+       for name in ('CDI', 'SELIC')},
+    # Equity indices
+    **{name: ('INDEX_SPOT', 'equities', 'NAME', name, None)
+       for name in ('CAC', 'DAX', 'FTSE', 'FTSE_MIB', 'IB5M11', 'IBEX35',
+                    'IBOV', 'IBX50', 'IMAB11', 'IRFM11', 'MXWO', 'S&P500',
+                    'STOXX50')},
+}
+
+
 def read_index(ix_name, ref_date):
     """
     Reads an index rate at given date.
@@ -228,47 +307,70 @@ def read_index(ix_name, ref_date):
         Index rate
     """
     ix_name = ix_name.upper()
-    ref_date_str = pd.Timestamp(ref_date).strftime("%Y%m%d")
+    ref_date_str = _ref_date_str(ref_date)
 
-    # Index
-    if ix_name in ('IDI1', 'IDI2', 'ISE', 'ITJLP', 'TR'):
-        filename = f'INDEX_ON_{ref_date_str}.txt'
-        filepath = _find_file(_SUBFOLDER_MAP['index'], filename)
-        s = pd.read_csv(filepath, sep=';', index_col='NAME', squeeze=True)
-        return s.at[ix_name]
-
-    # Inflation:
-    if ix_name.startswith(('IGPM', 'IPCA', 'INCCM')):
-        ix_row, _, ix_type = ix_name.partition('_')
-        col = {
-            '': 'LAST_VALUE',
-            'PRORATA': 'PRORATED_INDEX',
-            'RATE': 'VARIATION_FORECAST',
-        }.get(ix_type)
-        if col is not None:
-            filename = f'ON_INFLATION_{ref_date_str}.txt'
-            filepath = _find_file(_SUBFOLDER_MAP['rates'], filename)
-            df = pd.read_csv(filepath, sep=';', index_col='INDEX_NAME')
-            return df.at[ix_row, col]
+    try:
+        file_prefix, folder_key, index_col, row, col = _INDEX_DISPATCH[ix_name]
+    except KeyError:
+        raise ValueError(f"Unknown index {ix_name}") from None
 
-    # Overnight
-    if ix_name in ('CDI', 'SELIC'):
-        filename = f'ON_OVERNIGHT_{ref_date_str}.txt'
-        filepath = _find_file(_SUBFOLDER_MAP['rates'], filename)
-        s = pd.read_csv(filepath, sep=';', index_col='NAME', squeeze=True)
-        return s.at[ix_name]
+    df = _read_index_file(file_prefix, folder_key, index_col, ref_date_str)
+    return _index_value(df, row, col)
+
+
+def read_index_many(ix_names, ref_date):
+    """
+    Reads several index rates at given date, reading each
+    txt file only once. See read_index for the available indices.
+
+    Parameters
+    ----------
+    ix_names: list of str
+    ref_date: date_like
+        Reference date
+
+    Returns
+    -------
+    pd.Series
+        Index rates, indexed by the (uppercase) index names
+    """
+    ix_names = [ix_name.upper() for ix_name in ix_names]
+    for ix_name in ix_names:
+        if ix_name not in _INDEX_DISPATCH:
+            raise ValueError(f"Unknown index {ix_name}")
+    ref_date_str = _ref_date_str(ref_date)
+
+    # group the index names by file
+    names_by_file = defaultdict(list)
+    for ix_name in ix_names:
+        names_by_file[_INDEX_DISPATCH[ix_name][:3]].append(ix_name)
+
+    values = {}
+    for (file_prefix, folder_key, index_col), names in names_by_file.items():
+        df = _read_index_file(file_prefix, folder_key, index_col, ref_date_str)
+        for ix_name in names:
+            values[ix_name] = _index_value(df, *_INDEX_DISPATCH[ix_name][3:])
+
+    return pd.Series([values[ix_name] for ix_name in ix_names],
+                     index=ix_names, dtype=float)
+
+
+def _read_index_file(file_prefix, folder_key, index_col, ref_date_str):
+    """Reads one of read_index's txt files"""
+    filename = f'{file_prefix}_{ref_date_str}.txt'
+    filepath = _find_file(_SUBFOLDER_MAP[folder_key], filename)
+    return pd.read_csv(filepath, sep=';', index_col=index_col)
 
-    if ix_name in ('CAC', 'DAX', 'FTSE', 'FTSE_MIB', 'IB5M11', 'IBEX35', 'IBOV',
-                   'IBX50', 'IMAB11', 'IRFM11', 'MXWO', 'S&P500', 'STOXX50'):
-        filename = f'INDEX_SPOT_{ref_date_str}.txt'
-        filepath = _find_file(_SUBFOLDER_MAP['equities'], filename)
-        s = pd.read_csv(filepath, sep=';', index_col='NAME', squeeze=True)
-        return s.at[ix_name]
 
-    raise ValueError(f"Unknown index {ix_name}")
+def _index_value(df, row, col):
+    """Gets an index rate from a dataframe read by _read_index_file"""
+    if col is None:
+        # single column file
+        return df.squeeze(axis='columns').at[row]
+    return df.at[row, col]
 
 
-def load_pricing_tvm(ref_date):
+def load_pricing_tvm(ref_date, verify_integrity=False):
     """
     Load TVM txt w/ corporate bonds data
 
@@ -278,18 +380,22 @@ def load_pricing_tvm(ref_date):
     ----------
     ref_date: date_like
         reference date
+    verify_integrity: bool, default False
+        Check the 'NAME' index for duplicates (raises ValueError)
 
     Returns
     -------
     pd.Dataframe
     """
-    ref_date_str = pd.Timestamp(ref_date).strftime("%Y%m%d")
+    ref_date_str = _ref_date_str(ref_date)
     filename = f'TVM_{ref_date_str}.txt'
     filepath = _find_file(_SUBFOLDER_MAP['tvm'], filename)
 
     # load bond file
     df = pd.read_csv(filepath, sep=';')
-    df.columns = df.columns.str.upper()
+    upper_cols = df.columns.str.upper()
+    if not (df.columns == upper_cols).all():
+        df.columns = upper_cols
 
     # parse dates:
     if 'NTNB_REF' in df.columns:
@@ -297,7 +403,7 @@ def load_pricing_tvm(ref_date):
             df['NTNB_REF'], format='%d-%b-%y', errors='coerce'
         )
 
-    return df.set_index('NAME', verify_integrity=True)
+    return df.set_index('NAME', verify_integrity=verify_integrity)
 
 
 # apply useful 'available' function attribute to txt loading functions:
@@ -28,3 +28,8 @@ class TestBucket(unittest.TestCase):
                     bkt.distribute_values(to_), expected, rtol=0, atol=1.e-14
                 )
             )
+
+    def test_duplicated_labels(self):
+        for labels in (['1M', '1M'], ['1M', '30D'], ['1Y', '3M', '12M']):
+            with self.assertRaises(ValueError):
+                Bucket(labels)
@@ -2,6 +2,7 @@
 Tests for Label class
 """
 
+import itertools
 import unittest
 
 import pandas as pd
@@ -18,7 +19,7 @@ class TestLabelConstructor(unittest.TestCase):
             {9, 8, 1.2, 'hey'}, {5: 'A', 9: 'B'}, str,
         )
         for inp in invalid_type_inputs:
-            with self.assertRaises(TypeError):
+            with self.subTest(inp=inp), self.assertRaises(TypeError):
                 Label(inp)
 
     # testing for success
@@ -30,7 +31,8 @@ class TestLabelConstructor(unittest.TestCase):
             '54D', '8Y1M', '999D', '7W9D', '0Y', '0M', '0W', '0D', '9Y0D',
         )
         for inp in valid_inputs:
-            Label(inp)
+            with self.subTest(inp=inp):
+                Label(inp)
 
     # testing for failure
     def test_invalid_input(self):
@@ -44,9 +46,31 @@ class TestLabelConstructor(unittest.TestCase):
             '0.0D', '1d', '-1D', '-0Y', '+2W', '10 D', '9 Y'
         )
         for inp in invalid_inputs:
-            with self.assertRaises(ValueError):
+            with self.subTest(inp=inp), self.assertRaises(ValueError):
                 Label(inp)
 
+    # exhaustive combinations of letters and numbers of periods
+    def test_generated_input(self):
+        numbers = (0, 7, 999999)
+        for size in range(1, 5):
+            for letters in itertools.permutations('YMWD', size):
+                in_order = list(letters) == sorted(letters, key='YMWD'.index)
+                for nums in itertools.product(numbers, repeat=size):
+                    inp = ''.join(f'{n}{c}' for n, c in zip(nums, letters))
+                    if not in_order:
+                        with self.subTest(inp=inp), \
+                                self.assertRaises(ValueError):
+                            Label(inp)
+                        continue
+                    expected = dict.fromkeys('YMWD', 0)
+                    expected.update(zip(letters, nums))
+                    with self.subTest(inp=inp):
+                        self.assertEqual(Label(inp).letter_map, expected)
+                    # repeating the last letter is never valid
+                    with self.subTest(inp=inp + inp[-2:]), \
+                            self.assertRaises(ValueError):
+                        Label(inp + inp[-2:])
+
 
 class TestLabelDayCount(unittest.TestCase):
     def test_day_count(self):
@@ -67,7 +91,30 @@ class TestLabelDayCount(unittest.TestCase):
             ('2Y1M1W1D', 758),
         ]
         for label, dc in dc_map:
-            self.assertEqual(Label(label).dc_count, dc)
+            with self.subTest(label=label):
+                self.assertEqual(Label(label).dc_count, dc)
+
+        parsed = Label.parse_many([label for label, _ in dc_map])
+        self.assertEqual(parsed['dc_count'].tolist(), [dc for _, dc in dc_map])
+
+    def test_parse_many(self):
+        labels = ['1D', '1Y1M1W1D', '999999Y1M3D', '9Y0D', '7W']
+        parsed = Label.parse_many(labels)
+        for label in labels:
+            with self.subTest(label=label):
+                self.assertEqual(
+                    dict(Label(label).letter_map),
+                    parsed.loc[label, ['Y', 'M', 'W', 'D']].to_dict()
+                )
+                self.assertEqual(Label(label).dc_count,
+                                 parsed.at[label, 'dc_count'])
+
+        for invalid in (['1D', '1D2W'], ['5Y6Y'], [''], ['1d'], ['  9Y'],
+                        ['1Y\n'], ['\u0661Y']):
+            with self.subTest(labels=invalid), self.assertRaises(ValueError):
+                Label.parse_many(invalid)
+        with self.assertRaises(TypeError):
+            Label.parse_many(['1D', None])
 
     def test_labels_map(self):
         labels_map = [
@@ -86,25 +133,37 @@ class TestLabelDayCount(unittest.TestCase):
             ('1Y1W1D', {'Y': 1, 'M': 0, 'W': 1, 'D': 1}),
             ('2Y1M1W1D', {'Y': 2, 'M': 1, 'W': 1, 'D': 1}),
         ]
-        for label, dict_ in labels_map:
-            self.assertEqual(Label(label).letter_map, dict_)
+        # single assertion, listing all the mismatches on failure
+        mismatches = [(label, dict(Label(label).letter_map), dict_)
+                      for label, dict_ in labels_map
+                      if Label(label).letter_map != dict_]
+        self.assertEqual(mismatches, [])
 
 
 class TestLabelToDate(unittest.TestCase):
+    ref_date = pd.Timestamp("2020-01-08")
+    answers = (
+        # label | expected shifted date from ref_date
+        ('1D', pd.Timestamp("2020-01-09")),
+        ('1W', pd.Timestamp("2020-01-15")),
+        ('1M', pd.Timestamp("2020-02-10")),
+        ('1Y', pd.Timestamp("2021-01-08")),
+    )
+
     def test_labeltodate(self):
         """Labelshift testing"""
-        ref_date = "2020-01-08"
-        answers = [
-            # label | expected shifted date from ref_date
-            ('1D', "2020-01-09"),
-            ('1W', "2020-01-15"),
-            ('1M', "2020-02-10"),
-            ('1Y', "2021-01-08"),
-        ]
+        for label, expected in self.answers:
+            with self.subTest(label=label):
+                calc = Label(label).to_date(self.ref_date, date_adjust='DU',
+                                            cal='BRL')
+                self.assertEqual(expected, calc)
 
-        for label, expected in answers:
-            calc = Label(label).to_date(ref_date, date_adjust='DU', cal='BRL')
-            self.assertEqual(pd.Timestamp(expected), calc)
+    def test_to_date_many(self):
+        labels = [label for label, _ in self.answers]
+        calc = Label.to_date_many(labels, self.ref_date, date_adjust='DU',
+                                  cal='BRL')
+        self.assertEqual([expected for _, expected in self.answers],
+                         list(calc))
 
 
 if __name__ == '__main__':